@@ -2,17 +2,14 @@ import table.active_stats
 import utils.active_stats
 
 
-def _league_tables(sports, matchups, league_box_scores, descriptions):
-    data_by_team, categories_info = utils.active_stats.stats_by_team(matchups, league_box_scores, sports)
+def _league_tables(sports, matchup, league_box_scores, descriptions):
+    summary = utils.active_stats.summarize_by_team(matchup, league_box_scores, sports)
 
     tables = []
-    for team_key in sorted(data_by_team):
-        for group in data_by_team[team_key]:
-            team_stats = data_by_team[team_key][group]
-
-            team_categories = categories_info[team_key][group]
-            _, category_short = team_categories
-            team_player_totals = utils.active_stats.totals_by_players(team_stats, category_short, sports)
+    for team_key in sorted(summary['players']):
+        for group in summary['players'][team_key]:
+            team_categories = summary['categories'][team_key][group]
+            team_player_totals = utils.active_stats.totals_by_players(summary, team_key, group)
             if team_player_totals:
                 team_name = team_key[0]
                 tables.append([
@@ -28,11 +25,10 @@ def calculate_tables(group_settings, matchup, league_names, box_scores, descript
 
     sports = group_settings['sports']
     leagues_tables = []
-    matchups = range(1, matchup + 1)
     for league_id in group_settings['leagues']:
         league_name = league_names[league_id]
         league_box_scores = box_scores[league_id]
-        tables = _league_tables(sports, matchups, league_box_scores, descriptions)
+        tables = _league_tables(sports, matchup, league_box_scores, descriptions)
         link = f'https://fantasy.espn.com/{sports}/league?leagueId={league_id}'
         leagues_tables.append([league_name, link, tables])
 
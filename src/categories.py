@@ -1,5 +1,4 @@
 from collections import defaultdict, Counter
-import itertools
 
 import numpy as np
 
@@ -7,9 +6,11 @@ import table.analytics
 import table.categories
 import table.common
 import utils.active_stats
+import utils.aggregates
 import utils.categories
 import utils.common
 import utils.data
+import utils.teams
 
 
 _less_win_categories = ['TO', 'GAA', 'GA', 'PF']
@@ -39,19 +40,21 @@ def _each_team_tables(team_keys, categories, category_places, matchups, global_r
     titles = global_resources['titles']
     descriptions = global_resources['descriptions']
 
+    h2h_category_records = utils.categories.get_h2h_category_records(category_places, n_last)
+    power_predictions = utils.categories.get_power_predictions(category_places, matchups)
     tables = []
     for team_key in team_keys:
         team_name, _, _, _ = team_key
         tables.append([
             titles['team_category_record'].format(team_name), descriptions['team_category_record'],
-            table.analytics.h2h_category_record(category_places, categories, team_key, n_last)])
+            table.analytics.h2h_category_record(h2h_category_records[team_key], categories, n_last)])
         tables.append([
             titles['result_expectation'].format(team_name), descriptions['result_expectation'],
-            table.analytics.power_predictions(category_places, team_key, matchups)])
+            table.analytics.power_predictions(power_predictions[team_key], matchups)])
     return tables
 
 
-def _analytics_tables(group_settings, matchup, scoreboards, global_resources):
+def _analytics_tables(group_settings, matchup, scoreboards, global_resources, aggregate_keys, category_cubes):
     leagues = group_settings['leagues']
     is_analytics_enabled = group_settings.get('is_analytics_enabled', [])
     enabled_analytics_leagues = [league for is_enabled, league in zip(is_analytics_enabled, leagues) if is_enabled]
@@ -65,8 +68,10 @@ def _analytics_tables(group_settings, matchup, scoreboards, global_resources):
     matchups = np.arange(1, matchup + 1)
     for league in enabled_analytics_leagues:
         _, team_names, category_pairs, league_name = scoreboards[league]
-        categories, category_places, category_win_stats = utils.categories.get_each_category_stats(
-            matchups, category_pairs, _less_win_categories)
+        cube = None if category_cubes is None else category_cubes[league]
+        with utils.data.season_aggregates(league, sports, 'category_stats', aggregate_keys) as aggregates:
+            categories, category_places, category_win_stats = utils.categories.get_each_category_stats(
+                matchups, category_pairs, _less_win_categories, cube, aggregates)
 
         tables = []
         tables.append([
@@ -92,7 +97,7 @@ def _analytics_tables(group_settings, matchup, scoreboards, global_resources):
             table.analytics.power_predictions_h2h(category_places)])
 
         category_places_tables = _category_places_tables(categories, category_places, matchups, global_resources)
-        team_keys = [(team_name, team_id, league_name, league) for team_id, team_name in sorted(team_names.items())]
+        team_keys = [utils.teams.key(utils.teams.index(league, team_id)) for team_id in sorted(team_names)]
         each_team_tables = _each_team_tables(team_keys, categories, category_places, matchups, global_resources)
 
         league_link = f'https://fantasy.espn.com/{sports}/league?leagueId={league}'
@@ -112,7 +117,7 @@ def _matchup_table(league, group_settings, matchup, scoreboards, league_box_scor
 
     places_data = utils.categories.get_places_data(stats, categories, _less_win_categories)
     places_sum = utils.categories.get_places_sum(matchup_pairs, categories, _less_win_categories)
-    plays = None if league_box_scores is None else _plays_getters[sports](league_box_scores[matchup])
+    plays = None if league_box_scores is None else _plays_getters[sports](league_box_scores.totals(matchup))
     plays_places = None if plays is None else utils.common.get_places(plays, reverse=True)
     stats_with_plays = utils.categories.join_stats_and_plays(stats, plays)
     places_with_plays = utils.categories.join_stats_and_plays(places_data, plays_places)
@@ -151,7 +156,7 @@ def _overall_stats(group_settings, matchup, scoreboards, box_scores):
         for m in range(1, matchup + 1):
             stats_pairs, categories = category_pairs[m]
             overall_stats_pairs[m].extend(stats_pairs)
-        plays = None if box_scores is None else _plays_getters[sports](box_scores[league][matchup])
+        plays = None if box_scores is None else _plays_getters[sports](box_scores[league].totals(matchup))
         overall_plays = overall_plays if plays is None else overall_plays | plays
 
     return {
@@ -221,8 +226,7 @@ def _plays_tables(sports, matchups, league_box_scores, global_resources):
     plays = defaultdict(list)
     plays_places = defaultdict(list)
     for matchup in matchups:
-        matchup_box_scores_data = league_box_scores[matchup]
-        plays_matchup = _plays_getters[sports](matchup_box_scores_data)
+        plays_matchup = _plays_getters[sports](league_box_scores.totals(matchup))
         if not plays_matchup:
             raise Exception('Matchup plays for categories not found.')
 
@@ -250,52 +254,65 @@ def _plays_tables(sports, matchups, league_box_scores, global_resources):
     return plays_tables
 
 
-def _cumulative_stats(matchups, scores, category_pairs, tiebreaker):
+def _fold_cumulative_stats(state, m, category_pairs, tiebreaker, cube):
+    stats_pairs, categories = category_pairs[m]
+    opponent_dict = utils.common.get_opponent_dict(stats_pairs)
+    stats = utils.categories.get_matchup_stats(m, stats_pairs, categories, cube)
+
+    matchup_places = utils.categories.matchup_table_places(stats, categories, _less_win_categories)
+    for team, place in matchup_places.items():
+        state['places'].setdefault(team, []).append(place)
+        state['opponent_places'].setdefault(team, []).append(matchup_places[opponent_dict[team]])
+
+    teams, results = utils.categories.get_pair_results(stats, categories, _less_win_categories, tiebreaker)
+    comparison_stats = utils.categories.count_pair_results(teams, results)
+    for team in comparison_stats:
+        matchup_comparisons = '-'.join(map(str, comparison_stats[team]))
+        state['comparisons'].setdefault(team, []).append(matchup_comparisons)
+        opponent_matchup_comparisons = '-'.join(map(str, comparison_stats[opponent_dict[team]]))
+        state['opponent_comparisons'].setdefault(team, []).append(opponent_matchup_comparisons)
+
+    for team, team_result in utils.categories.get_opponent_results(teams, results, opponent_dict).items():
+        state['win_record'].setdefault(team, Counter())[team_result] += 1
+        state['win_stats'].setdefault(team, []).append(team_result)
+
+    for team, team_comparisons in utils.categories.get_h2h_comparisons([(teams, results)]).items():
+        team_comparisons_h2h = state['comparisons_h2h'].setdefault(team, {})
+        for opponent, pair_counts in team_comparisons.items():
+            team_comparisons_h2h[opponent] = team_comparisons_h2h.get(opponent, Counter()) + pair_counts
+
+    # Expectations of a matchup do not depend on the other matchups, so they are folded in one by one as well
+    (expected_score, tiebreaker_stats), = utils.categories.get_season_expectations(
+        [(stats, categories)], _less_win_categories, tiebreaker)
+    expected_result = utils.categories.get_expected_result(expected_score, tiebreaker_stats, opponent_dict)
+    for team, team_expected_score in expected_score.items():
+        state['expected_category_record'].setdefault(team, []).append(team_expected_score)
+        state['expected_win_record'].setdefault(team, []).append(expected_result[team])
+
+
+def _cumulative_stats(matchups, scores, category_pairs, tiebreaker, cube, aggregates):
+    stats_names = [
+        'comparisons', 'opponent_comparisons', 'expected_category_record', 'win_record', 'win_stats',
+        'expected_win_record', 'comparisons_h2h', 'places', 'opponent_places',
+    ]
+    # Season totals up to the latest unchanged matchup are reused, only the newer matchups are folded in
+    state = utils.aggregates.fold(
+        aggregates, max(matchups), lambda: {name: {} for name in stats_names},
+        lambda state, m: _fold_cumulative_stats(state, m, category_pairs, tiebreaker, cube))
+
     cumulative_stats = {
-        'comparisons': defaultdict(list),
-        'opponent_comparisons': defaultdict(list),
-        'expected_category_record': defaultdict(list),
-        'win_record': defaultdict(Counter),
-        'win_stats': defaultdict(list),
-        'expected_win_record': defaultdict(list),
+        'comparisons': defaultdict(list, state['comparisons']),
+        'opponent_comparisons': defaultdict(list, state['opponent_comparisons']),
+        'expected_category_record': defaultdict(list, state['expected_category_record']),
+        'win_record': defaultdict(Counter, state['win_record']),
+        'win_stats': defaultdict(list, state['win_stats']),
+        'expected_win_record': defaultdict(list, state['expected_win_record']),
         'comparisons_h2h': defaultdict(lambda: defaultdict(Counter)),
+        'places': defaultdict(list, state['places']),
+        'opponent_places': defaultdict(list, state['opponent_places']),
     }
-    cumulative_stats['places'], cumulative_stats['opponent_places'] = utils.categories.cumulative_matchup_table_places(
-        matchups, category_pairs, _less_win_categories)
-
-    for m in matchups:
-        stats_pairs, categories = category_pairs[m]
-        opponent_dict = utils.common.get_opponent_dict(stats_pairs)
-        stats = utils.categories.get_stats(stats_pairs)
-        comparison_stats = utils.categories.get_comparison_stats(stats, categories, _less_win_categories, tiebreaker)
-
-        for team in comparison_stats:
-            matchup_comparisons = '-'.join(map(str, comparison_stats[team]))
-            cumulative_stats['comparisons'][team].append(matchup_comparisons)
-            opponent_matchup_comparisons = '-'.join(map(str, comparison_stats[opponent_dict[team]]))
-            cumulative_stats['opponent_comparisons'][team].append(opponent_matchup_comparisons)
-
-        for team in stats:
-            opponent = opponent_dict[team]
-            team_result, _ = utils.categories.get_pair_result(
-                stats[team], stats[opponent], categories, _less_win_categories, tiebreaker)
-            cumulative_stats['win_record'][team][team_result] += 1
-            cumulative_stats['win_stats'][team].append(team_result)
-
-        expected_score = utils.categories.get_expected_score(stats, categories, _less_win_categories)
-        tiebreaker_stats = utils.categories.get_tiebreaker_expectation(
-            stats, categories, _less_win_categories, tiebreaker)
-        expected_result = utils.categories.get_expected_result(expected_score, tiebreaker_stats, opponent_dict)
-        for team in expected_score:
-            cumulative_stats['expected_category_record'][team].append(expected_score[team])
-            cumulative_stats['expected_win_record'][team].append(expected_result[team])
-
-        for team, opponent in itertools.combinations(stats.keys(), 2):
-            team_result, opponent_result = utils.categories.get_pair_result(
-                stats[team], stats[opponent], categories, _less_win_categories, tiebreaker)
-            cumulative_stats['comparisons_h2h'][team][opponent][team_result] += 1
-            cumulative_stats['comparisons_h2h'][opponent][team][opponent_result] += 1
-
+    for team, team_comparisons in state['comparisons_h2h'].items():
+        cumulative_stats['comparisons_h2h'][team].update(team_comparisons)
     cumulative_stats['category_record'] = utils.categories.calculate_category_record(scores, matchups)
     cumulative_stats['category_scores'] = utils.categories.get_category_scores(scores, matchups)
     return cumulative_stats
@@ -352,18 +369,16 @@ def _cumulative_tables(cumulative_stats, matchups, global_resources, is_each_cat
     return tables
 
 
-def _rotisserie_tables(matchups, league_box_scores, sports, categories, global_resources):
+def _rotisserie_tables(matchup, league_box_scores, sports, categories, global_resources):
     if league_box_scores is None:
         return []
 
-    stats_by_team, categories_info = utils.active_stats.stats_by_team(matchups, league_box_scores, sports)
+    summary = utils.active_stats.summarize_by_team(matchup, league_box_scores, sports)
+    categories_info = summary['categories']
     totals_by_team = defaultdict(dict)
-    for team_key, team_stats in stats_by_team.items():
-        for group, group_team_stats in team_stats.items():
-            team_categories = categories_info[team_key][group]
-            _, category_short = team_categories
-            group_team_totals = utils.active_stats.totals_by_team(group_team_stats, category_short, sports)
-            totals_by_team[team_key][group] = group_team_totals
+    for team_key, team_stats in summary['teams'].items():
+        for group in team_stats:
+            totals_by_team[team_key][group] = utils.active_stats.totals_by_team(summary, team_key, group)
 
     league_categories = {}
     for team_categories in categories_info.values():
@@ -403,7 +418,7 @@ def _rotisserie_tables(matchups, league_box_scores, sports, categories, global_r
     return tables
 
 
-def _group_tables(group_settings, matchup, scoreboards, box_scores, global_resources):
+def _group_tables(group_settings, matchup, scoreboards, box_scores, global_resources, aggregate_keys, category_cubes):
     titles = global_resources['titles']
     descriptions = global_resources['descriptions']
     is_each_category = group_settings['is_each_category']
@@ -420,8 +435,10 @@ def _group_tables(group_settings, matchup, scoreboards, box_scores, global_resou
 
         scores, _, category_pairs, league_name = scoreboards[league]
         _, categories = category_pairs[matchup]
-        roto_tables = _rotisserie_tables(matchups, league_box_scores, sports, categories, global_resources)
-        cumulative_stats = _cumulative_stats(matchups, scores, category_pairs, tiebreaker)
+        roto_tables = _rotisserie_tables(matchup, league_box_scores, sports, categories, global_resources)
+        cube = None if category_cubes is None else category_cubes[league]
+        with utils.data.season_aggregates(league, sports, 'cumulative_stats', aggregate_keys) as aggregates:
+            cumulative_stats = _cumulative_stats(matchups, scores, category_pairs, tiebreaker, cube, aggregates)
         cumulative_tables = _cumulative_tables(cumulative_stats, matchups, global_resources, is_each_category)
         plays_tables = _plays_tables(sports, matchups, league_box_scores, global_resources)
 
@@ -432,9 +449,12 @@ def _group_tables(group_settings, matchup, scoreboards, box_scores, global_resou
     return group_tables
 
 
-def calculate_tables(group_settings, matchup, scoreboards, box_scores, global_resources):
-    group_tables = _group_tables(group_settings, matchup, scoreboards, box_scores, global_resources)
-    analytics_tables = _analytics_tables(group_settings, matchup, scoreboards, global_resources)
+def calculate_tables(group_settings, matchup, scoreboards, box_scores, global_resources, aggregate_keys,
+                     category_cubes=None):
+    group_tables = _group_tables(
+        group_settings, matchup, scoreboards, box_scores, global_resources, aggregate_keys, category_cubes)
+    analytics_tables = _analytics_tables(
+        group_settings, matchup, scoreboards, global_resources, aggregate_keys, category_cubes)
 
     overall_tables = []
     if len(group_settings['leagues']) > 1:
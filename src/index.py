@@ -1,5 +1,4 @@
 from collections import defaultdict
-from copy import deepcopy
 from multiprocessing.dummy import Pool as ThreadPool
 from operator import itemgetter
 import os
@@ -10,8 +9,14 @@ import traceback
 import active_stats
 import categories
 import points
+import table.cache
+import utils.browser
 import utils.common
 import utils.data
+import utils.espn_api
+import utils.planner
+import utils.run_stats
+import utils.season_cache
 from utils.json_utils import dump as json_dump
 from utils.json_utils import load as json_load
 
@@ -19,43 +24,51 @@ from utils.json_utils import load as json_load
 _repo_root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
 _all_types = ['categories', 'points']
 _tables_calculators = {'points': points.calculate_tables, 'categories': categories.calculate_tables}
+_calculators_report_types = {'points': ['results'], 'categories': ['results', 'analytics']}
 
 
-def _calculate_online_matchups(refresh_range, matchup, is_season_ended, is_data_loaded, is_full_support):
-    if not is_full_support:
-        return []
-
-    if is_season_ended:
-        return [matchup]
-
-    return [] if is_data_loaded else refresh_range
-
-
-def _process_group(group_settings, schedule, scoring_type, browser, global_resources, matchup_info):
+def _process_group(group_settings, schedule, scoring_type, source, global_resources, matchup_info):
     global_config = global_resources['config']
     sports = group_settings['sports']
-    scoreboards = {}
-    league_names = {}
 
     current_matchup = matchup_info['current']
     online_matchups = matchup_info['online']
     is_category_league = scoring_type == 'categories'
-    for league in group_settings['leagues']:
-        scoreboards[league] = utils.data.load_scoreboards(
-            league, sports, current_matchup, browser, online_matchups, is_category_league)
-        league_names[league] = scoreboards[league][3]
+    page_hashes = utils.data.PageHashes(sports)
+    scoreboards = utils.data.group_scoreboards(
+        group_settings, current_matchup, source, online_matchups, is_category_league, page_hashes)
+    league_names = {league: scoreboards[league][3] for league in group_settings['leagues']}
 
     main_league = group_settings['leagues'][0]
     main_league_name = league_names[main_league]
 
     box_scores = utils.data.group_box_scores(
-        group_settings, schedule, current_matchup, browser, scoreboards, online_matchups)
+        group_settings, schedule, current_matchup, source, scoreboards, online_matchups, page_hashes,
+        global_config['max_loaded_box_scores'])
+
+    # Every report the group would write has to be on disk, or a missing one would never be rebuilt
+    report_types = _calculators_report_types[scoring_type] + (['active stats'] if box_scores else [])
+    is_reports_saved = all(
+        utils.common.is_report_saved(group_settings, matchup, global_config, report_type)
+        for matchup in matchup_info['to_process'] for report_type in report_types
+    )
+    if global_config['skip_unchanged_groups'] and page_hashes.is_unchanged() and is_reports_saved:
+        utils.run_stats.add('change detection', 'skipped groups')
+        utils.data.close_box_scores(box_scores)
+        page_hashes.save()
+        return league_names
 
     tables_calculator = _tables_calculators[scoring_type]
     scoreboards = utils.data.apply_activation_scoreboards(
         scoreboards, box_scores, group_settings, schedule, is_category_league)
+    aggregate_keys = utils.data.group_aggregate_keys(group_settings, schedule, scoreboards, page_hashes)
+    calculator_params = {}
+    if is_category_league:
+        calculator_params['category_cubes'] = utils.data.group_category_cubes(
+            group_settings, current_matchup, box_scores, schedule)
     for matchup in matchup_info['to_process']:
-        tables = tables_calculator(group_settings, matchup, scoreboards, box_scores, global_resources)
+        tables = tables_calculator(
+            group_settings, matchup, scoreboards, box_scores, global_resources, aggregate_keys, **calculator_params)
 
         active_stats_tables = active_stats.calculate_tables(
             group_settings, matchup, league_names, box_scores, global_resources['descriptions'])
@@ -67,53 +80,70 @@ def _process_group(group_settings, schedule, scoring_type, browser, global_resou
             template_params.update(type_tables)
             utils.common.save_tables(group_settings, matchup, schedule, global_config, report_type, template_params)
 
+    utils.data.close_box_scores(box_scores)
     utils.common.save_league_index(main_league_name, group_settings, global_config)
+    page_hashes.save()
     return league_names
 
 
-def _process_league_groups(global_resources, leagues, sports_to_process, data_loaded_matchups, browser):
-    result = {
-        'league_names': defaultdict(dict),
-        'data_loaded_matchups': defaultdict(dict),
-    }
-    try:
-        for group_settings, scoring_type, _ in leagues:
-            if group_settings['sports'] not in sports_to_process:
-                continue
+def _process_league_group(global_resources, group_settings, scoring_type, data_loaded_matchups, source, result):
+    global_config = global_resources['config']
+    schedule = utils.data.group_schedule(group_settings, source, global_config['use_offline_schedule'])
+    if schedule is None:
+        return
 
-            global_config = global_resources['config']
-            schedule = utils.data.group_schedule(group_settings, browser, global_config['use_offline_schedule'])
-            if schedule is None:
-                continue
+    main_league = group_settings['leagues'][0]
+    sports = group_settings['sports']
+    group_loaded_matchups = data_loaded_matchups[sports].get(main_league, [])
+    matchup_info = utils.planner.matchup_plan(
+        group_settings, schedule, group_loaded_matchups, global_config['refresh_matchups'])
+    if matchup_info is None:
+        return
 
-            matchup, is_season_ended = utils.common.find_proper_matchup(schedule)
-            if matchup == -1:
-                continue
+    league_names = _process_group(
+        group_settings, schedule, scoring_type, source, global_resources, matchup_info)
 
-            main_league = group_settings['leagues'][0]
-            sports = group_settings['sports']
-            group_loaded_matchups = data_loaded_matchups[sports].get(main_league, [])
-            matchup_str = str(matchup)
-            is_data_loaded = matchup_str in group_loaded_matchups
-            is_full_support = group_settings['is_full_support']
+    matchup_str = str(matchup_info['current'])
+    result['league_names'][sports].update(league_names)
+    result['data_loaded_matchups'][sports][main_league] = list(set(group_loaded_matchups + [matchup_str]))
 
-            refresh_range_left = max(1, matchup - global_config['refresh_matchups'])
-            refresh_range = list(range(refresh_range_left, matchup + 1))
-            online_matchups = _calculate_online_matchups(
-                refresh_range, matchup, is_season_ended, is_data_loaded, is_full_support)
-            process_matchups = refresh_range if is_full_support else [matchup]
 
-            matchup_info = {'current': matchup, 'online': online_matchups, 'to_process': process_matchups}
-            league_names = _process_group(
-                group_settings, schedule, scoring_type, browser, global_resources, matchup_info)
+def _report_browser_startup(job, browser_pool):
+    launches = [] if browser_pool is None else browser_pool.job_launches(job)
+    utils.run_stats.set_value('browser startup', f'job {job} launched', 'yes' if launches else 'no')
+    if launches:
+        utils.run_stats.set_value('browser startup', f'job {job} startup seconds', round(sum(launches), 2))
 
-            result['league_names'][sports].update(league_names)
-            result['data_loaded_matchups'][sports][main_league] = list(set(group_loaded_matchups + [matchup_str]))
 
-    except Exception as e:
-        result.update({'error': e})
-    finally:
-        return result
+def _process_league_groups(global_resources, job, leagues, sports_to_process, data_loaded_matchups, source,
+                           browser_pool):
+    result = {
+        'league_names': defaultdict(dict),
+        'data_loaded_matchups': defaultdict(dict),
+    }
+    for group_settings, scoring_type, _ in leagues:
+        if group_settings['sports'] not in sports_to_process:
+            continue
+
+        try:
+            _process_league_group(global_resources, group_settings, scoring_type, data_loaded_matchups, source, result)
+        except Exception as e:
+            print(f'[Group error] {group_settings["sports"]} {group_settings["leagues"]}:', file=sys.stderr)
+            traceback.print_exc()
+            result.update({'error': e})
+    _report_browser_startup(job, browser_pool)
+    return result
+
+
+def _print_plan(settings_splitted, sports_to_process, data_loaded_matchups, global_config):
+    for job_settings in settings_splitted:
+        for group_settings, _, _ in job_settings:
+            sports = group_settings['sports']
+            if sports not in sports_to_process:
+                continue
+            group_loaded_matchups = data_loaded_matchups[sports].get(group_settings['leagues'][0], [])
+            plan = utils.planner.group_plan(group_settings, group_loaded_matchups, global_config)
+            print(utils.planner.format_plan(group_settings, plan))
 
 
 def _parse_arguments():
@@ -162,32 +192,56 @@ def _split_leagues_to_jobs(types_to_process, n_jobs):
 def main(global_resources):
     sports_to_process, types_to_process = _parse_arguments()
     global_config = global_resources['config']
+    if '--reparse' in sys.argv[1:]:
+        utils.data.reparse_archives(global_config['reparse_processes'] or None)
+        print(utils.run_stats.format_report())
+        return
+    if '--migrate-pickles' in sys.argv[1:]:
+        utils.data.migrate_pickles()
+        print(utils.run_stats.format_report())
+        return
+
+    utils.season_cache.configure(global_config['season_cache_mb'])
+    table.cache.configure(global_config['html_cache'])
     n_jobs = global_config['n_jobs']
     settings_splitted, leagues_settings = _split_leagues_to_jobs(types_to_process, n_jobs)
 
     data_loaded_matchups_path = os.path.join(_repo_root_dir, 'res/data_loaded_matchups.config')
     data_loaded_matchups = json_load(data_loaded_matchups_path, defaultdict(dict))
-    sleep_timeout = global_config['timeout']
-    if n_jobs == 1:
-        names_and_matchups = _process_league_groups(
-            global_resources, settings_splitted[0], sports_to_process,
-            data_loaded_matchups, utils.data.BrowserManager(50, sleep_timeout))
-        names_and_matchups_list = [names_and_matchups]
+    if '--plan' in sys.argv[1:]:
+        _print_plan(settings_splitted, sports_to_process, data_loaded_matchups, global_config)
+        return
+    rate_limit_settings = global_config['rate_limit']
+    browser_pool = None
+    api_source = None
+    if global_config['data_source'] == 'api':
+        api_source = utils.espn_api.ApiSource(global_config['api'], global_config['fetch'])
     else:
-        pool = ThreadPool(n_jobs)
-        process_params = [
-            (
-                deepcopy(global_resources),
-                job_settings,
-                deepcopy(sports_to_process),
-                deepcopy(data_loaded_matchups),
-                utils.data.BrowserManager(50, sleep_timeout)
-            )
-            for job_settings in settings_splitted
-        ]
-        names_and_matchups_list = pool.starmap(_process_league_groups, process_params)
-        pool.close()
-        pool.join()
+        browser_pool = utils.browser.BrowserPool(
+            global_config['n_browsers'], global_config['browser_recycling'], rate_limit_settings,
+            global_config['lean_profile'])
+    # Pages are submitted with their job id, so browser launches are reported for the job that caused them
+    job_source = lambda job: api_source if api_source is not None else utils.data.PageSource(
+        browser_pool, global_config['fetch'], global_config['page_archive'], job)
+    try:
+        if n_jobs == 1:
+            names_and_matchups = _process_league_groups(
+                global_resources, 1, settings_splitted[0], sports_to_process, data_loaded_matchups, job_source(1),
+                browser_pool)
+            names_and_matchups_list = [names_and_matchups]
+        else:
+            pool = ThreadPool(n_jobs)
+            process_params = [
+                (global_resources, job, job_settings, sports_to_process, data_loaded_matchups, job_source(job),
+                 browser_pool)
+                for job, job_settings in enumerate(settings_splitted, 1)
+            ]
+            names_and_matchups_list = pool.starmap(_process_league_groups, process_params)
+            pool.close()
+            pool.join()
+    finally:
+        if browser_pool is not None:
+            browser_pool.clear()
 
     error = None
     league_names_path = os.path.join(_repo_root_dir, 'res/league_names.json')
@@ -203,12 +257,15 @@ def main(global_resources):
     json_dump(league_names, league_names_path)
     json_dump(data_loaded_matchups, data_loaded_matchups_path)
 
+    table.cache.prune()
+    print(utils.run_stats.format_report())
     if error is not None:
         raise error
 
     utils.common.save_homepage(global_config, leagues_settings, league_names)
     utils.common.save_archive(global_config, league_names)
     utils.common.save_report_type_indexes(global_config, league_names)
+    return utils.common.save_output_manifest()
 
 
 if __name__ == '__main__':
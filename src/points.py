@@ -14,8 +14,8 @@ _plays_per_game = {'basketball': 30, 'hockey': 1}
 _plays_names = {'basketball': 'minutes', 'hockey': 'games'}
 
 
-def _league_scores_tables(matchups, scores, scores_pairs, global_resources):
-    scores_metrics = utils.points.calculate_scores_metrics(scores_pairs, matchups)
+def _league_scores_tables(matchups, scores, scores_pairs, aggregates, global_resources):
+    scores_metrics = utils.points.calculate_scores_metrics(scores_pairs, matchups, aggregates)
 
     n_last = global_resources['config']['n_last_matchups']
     titles = global_resources['titles']
@@ -72,12 +72,8 @@ def _league_plays_tables(sports, matchups, scores, plays, plays_places, global_r
         titles['mean'], descriptions['mean'],
         table.common.scores(mean_scores, matchups, False, n_last)])
 
-    mean_scores_places = defaultdict(list)
-    for m in matchups:
-        matchup_mean_scores = {team: team_mean_scores[m - 1] for team, team_mean_scores in mean_scores.items()}
-        matchup_places = utils.common.get_places(matchup_mean_scores, True)
-        for team, value in matchup_places.items():
-            mean_scores_places[team].append(value)
+    mean_scores_places = utils.common.get_places_rows(
+        {team: team_mean_scores[:len(matchups)] for team, team_mean_scores in mean_scores.items()}, True)
     tables.append([
         titles['mean_places'], descriptions['mean_places'],
         table.common.places(mean_scores_places, matchups, False, False, n_last)])
@@ -92,12 +88,8 @@ def _overall_tables(n_leagues, matchups, overall_scores, global_resources):
 
     overall_tables = []
     if n_leagues > 1:
-        overall_places = defaultdict(list)
-        for m in matchups:
-            matchup_overall_scores = {team: overall_scores[team][m - 1] for team in overall_scores}
-            matchup_overall_places = utils.common.get_places(matchup_overall_scores, True)
-            for team in matchup_overall_places:
-                overall_places[team].append(matchup_overall_places[team])
+        overall_places = utils.common.get_places_rows(
+            {team: team_scores[:len(matchups)] for team, team_scores in overall_scores.items()}, True)
         overall_tables.append([
             titles['places_overall'], descriptions['places_overall'],
             table.common.places(overall_places, matchups, False, True, n_last)])
@@ -137,7 +129,7 @@ def _overall_tables(n_leagues, matchups, overall_scores, global_resources):
     return overall_tables
 
 
-def calculate_tables(league_settings, matchup, scoreboards, box_scores, global_resources):
+def calculate_tables(league_settings, matchup, scoreboards, box_scores, global_resources, aggregate_keys):
     leagues = league_settings['leagues']
     sports = league_settings['sports']
 
@@ -154,7 +146,8 @@ def calculate_tables(league_settings, matchup, scoreboards, box_scores, global_r
                 scores[p2[0]].append(p2[1])
         overall_scores.update(scores)
 
-        scores_tables = _league_scores_tables(matchups, scores, scores_pairs, global_resources)
+        with utils.data.season_aggregates(league_id, sports, 'scores_metrics', aggregate_keys) as aggregates:
+            scores_tables = _league_scores_tables(matchups, scores, scores_pairs, aggregates, global_resources)
         league_link = f'https://fantasy.espn.com/{sports}/league?leagueId={league_id}'
         if not league_settings['is_full_support']:
             tables.append([league_name, league_link, scores_tables])
@@ -163,8 +156,7 @@ def calculate_tables(league_settings, matchup, scoreboards, box_scores, global_r
         plays = defaultdict(list)
         plays_places = defaultdict(list)
         for m in matchups:
-            matchup_box_scores = box_scores[league_id][m]
-            matchup_plays = _plays_getters[sports](matchup_box_scores)
+            matchup_plays = _plays_getters[sports](box_scores[league_id].totals(m))
             if not matchup_plays:
                 raise Exception('Matchup plays for points not found.')
 
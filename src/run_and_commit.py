@@ -48,17 +48,24 @@ def main():
         git_repo.git.checkout(branch)
         git_repo.git.pull('origin', branch, env={'GIT_SSH_COMMAND': f'ssh -i ~/.ssh/{ssh_key}'})
 
-    index.main(global_res)
+    changed_paths = index.main(global_res)
 
     for report_type in report_types:
         repo = global_config[report_type]['repo_name']
         branch = global_config[report_type]['branch']
         ssh_key = global_config[report_type]['ssh_key']
 
-        repo_path = os.path.join(_repo_root_dir, '..', repo)
+        repo_path = os.path.abspath(os.path.join(_repo_root_dir, '..', repo))
+        repo_changed_paths = [
+            os.path.relpath(path, repo_path) for path in changed_paths if path.startswith(repo_path + os.sep)
+        ]
+        if not repo_changed_paths:
+            continue
+
         git_repo = git.Repo.init(repo_path)
-        if git_repo.is_dirty():
-            git_repo.git.add('.')
+        git_repo.git.add('--', *repo_changed_paths)
+        # Rewritten files may still match the committed ones, so only the staged changes are checked
+        if git_repo.is_dirty(index=True, working_tree=False):
             today = datetime.datetime.today().date()
             today_str = today.strftime('%Y-%m-%d')
             git_repo.git.commit('-m', f'Run and commit executed {today_str}')
@@ -4,7 +4,7 @@ import copy
 import numpy as np
 import pandas as pd
 
-from table import style
+from table import cache, style
 from table.common import add_position_column
 
 
@@ -37,6 +37,7 @@ def _calculate_player_rows(player, stats, all_categories, category_short):
     return data_row, columns_row
 
 
+@cache.cached
 def matchup(players_stats, categories_data):
     render_data = []
     category_columns = []
@@ -59,4 +60,4 @@ def matchup(players_stats, categories_data):
     table_attrs = style.calculate_table_attributes(isSortable=True, hasPositionColumn=True)
     styler = df.style.format('{:g}', subset=list(set(category_columns) - {'ATOI', ' ', '  '})).\
         set_table_attributes(table_attrs).hide()
-    return styler.to_html()
+    return style.to_html(styler)
@@ -4,9 +4,10 @@ from operator import itemgetter
 import numpy as np
 import pandas as pd
 
-from table import common, style
+from table import cache, common, style
 
 
+@cache.cached
 def category_power(places_by_categories, categories, n_last=None):
     df_data = defaultdict(list)
     slice_left = 0 if n_last is None else -n_last
@@ -32,9 +33,10 @@ def category_power(places_by_categories, categories, n_last=None):
     styler = df.style.format('{:g}', subset=categories).\
         set_table_attributes(table_attributes).hide().\
         apply(style.category_power, subset=categories)
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def category_rankings(places_by_categories, categories):
     category_powers = defaultdict(list)
     for category in places_by_categories:
@@ -53,37 +55,16 @@ def category_rankings(places_by_categories, categories):
     df = df.iloc[np.lexsort((df['Team'],))]
     table_attributes = style.calculate_table_attributes(isSortable=False, hasPositionColumn=False)
     styler = df.style.set_table_attributes(table_attributes).hide()
-    return styler.to_html()
+    return style.to_html(styler)
 
 
-def h2h_category_record(places_by_categories, categories, my_team_key, n_last):
+@cache.cached
+def h2h_category_record(team_records, categories, n_last):
     df_data = defaultdict(list)
-    h2h_records = defaultdict(list)
-    recent_h2h_records = defaultdict(list)
-    for category in places_by_categories:
-        my_team_places = np.array(places_by_categories[category][my_team_key])
-        recent_my_team_places = np.array(places_by_categories[category][my_team_key][-n_last:])
-        for team in places_by_categories[category]:
-            if team == my_team_key:
-                continue
-
-            opponent_places = np.array(places_by_categories[category][team])
-            wins = (my_team_places < opponent_places).sum()
-            losses = (my_team_places > opponent_places).sum()
-            draws = (my_team_places == opponent_places).sum()
-
-            df_data[team].append(f'{wins}-{losses}-{draws}')
-            h2h_records[team].append([wins, losses, draws])
-
-            recent_opponent_places = np.array(places_by_categories[category][team][-n_last:])
-            recent_wins = (recent_my_team_places < recent_opponent_places).sum()
-            recent_losses = (recent_my_team_places > recent_opponent_places).sum()
-            recent_draws = (recent_my_team_places == recent_opponent_places).sum()
-            recent_h2h_records[team].append([recent_wins, recent_losses, recent_draws])
-
-    for team in h2h_records:
-        team_summary = np.sum(h2h_records[team], axis=0)
-        team_recent_summary = np.sum(recent_h2h_records[team], axis=0)
+    for team, (records, recent_records) in team_records.items():
+        df_data[team].extend(f'{wins}-{losses}-{draws}' for wins, losses, draws in records)
+        team_summary = np.sum(records, axis=0)
+        team_recent_summary = np.sum(recent_records, axis=0)
         df_data[team].extend(team_summary)
         team_power = np.sum(team_summary * np.array([1.0, 0.0, 0.5]))
         team_recent_power = np.sum(team_recent_summary * np.array([1.0, 0.0, 0.5]))
@@ -101,33 +82,15 @@ def h2h_category_record(places_by_categories, categories, my_team_key, n_last):
     styler = df.style.format('{:g}', subset=percentage_cols).\
         set_table_attributes(table_attributes).hide().\
         map(style.percentage, subset=percentage_cols)
-    return styler.to_html()
+    return style.to_html(styler)
 
 
-def power_predictions(places_by_categories, my_team_key, matchups):
+@cache.cached
+def power_predictions(team_predictions, matchups):
     df_data = defaultdict(list)
-    sum_stats = defaultdict(list)
-
-    for m in matchups:
-        matchup_team_data = defaultdict(list)
-        for category in places_by_categories:
-            for team in places_by_categories[category]:
-                matchup_team_data[team].append(np.mean(places_by_categories[category][team][:m]))
-
-        my_team_places = np.array(matchup_team_data[my_team_key])
-        for team in matchup_team_data:
-            if team == my_team_key:
-                continue
-            opponent_places = np.array(matchup_team_data[team])
-            wins = (my_team_places < opponent_places).sum()
-            losses = (my_team_places > opponent_places).sum()
-            draws = (my_team_places == opponent_places).sum()
-
-            df_data[team].append(f'{wins}-{losses}-{draws}')
-            sum_stats[team].append([wins, losses, draws])
-
-    for team in sum_stats:
-        team_summary = np.sum(sum_stats[team], axis=0)
+    for team, records in team_predictions.items():
+        df_data[team].extend(f'{wins}-{losses}-{draws}' for wins, losses, draws in records)
+        team_summary = np.sum(records, axis=0)
         df_data[team].extend(team_summary)
         team_power = np.sum(team_summary * np.array([1.0, 0.0, 0.5]))
         df_data[team].append(np.round(team_power / np.sum(team_summary), 2))
@@ -140,7 +103,7 @@ def power_predictions(places_by_categories, my_team_key, matchups):
     table_attributes = style.calculate_table_attributes(isSortable=False, hasPositionColumn=True)
     styler = df.style.format({'%': '{:g}'}).set_table_attributes(table_attributes).hide().\
         map(style.percentage, subset=['%'])
-    return styler.to_html()
+    return style.to_html(styler)
 
 
 def power_predictions_h2h(places_by_categories):
@@ -162,6 +125,7 @@ def power_predictions_h2h(places_by_categories):
     return common.h2h(comparisons_h2h)
 
 
+@cache.cached
 def category_win_stats(win_stats, categories, n_last=None):
     df_data = defaultdict(list)
     slice_left = 0 if n_last is None else -n_last
@@ -186,4 +150,4 @@ def category_win_stats(win_stats, categories, n_last=None):
     styler = df.style.format('{:g}', subset=categories).\
         set_table_attributes(table_attributes).hide().\
         apply(style.each_category_win_stat, subset=categories)
-    return styler.to_html()
+    return style.to_html(styler)
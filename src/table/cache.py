@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict
+import functools
+import glob
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.run_stats
+
+
+_table_dir = os.path.dirname(os.path.abspath(__file__))
+_cache_dir = os.path.join(_table_dir, '..', '..', 'data', 'html_tables')
+_lock = threading.Lock()
+_counts = defaultdict(Counter)
+_settings = {'enabled': False, 'max_age_days': 30}
+
+
+def _code_version():
+    # Any change to table code or pandas rendering makes all previously cached tables unreachable
+    version = hashlib.sha256(pd.__version__.encode('utf-8'))
+    for path in sorted(glob.glob(os.path.join(_table_dir, '*.py'))):
+        with open(path, 'rb') as fp:
+            version.update(fp.read())
+    return version.hexdigest()
+
+
+_version = _code_version()
+
+
+def _update_hash(key_hash, value):
+    key_hash.update(f'<{type(value).__name__}>'.encode('utf-8'))
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return _update_hash(key_hash, value.tolist())
+        key_hash.update(f'{value.dtype.str}{value.shape}'.encode('utf-8'))
+        key_hash.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        key_hash.update(str(len(value)).encode('utf-8'))
+        return all(_update_hash(key_hash, key) and _update_hash(key_hash, item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        key_hash.update(str(len(value)).encode('utf-8'))
+        return all(_update_hash(key_hash, item) for item in value)
+    elif isinstance(value, (set, frozenset)):
+        return _update_hash(key_hash, sorted(value, key=repr))
+    elif isinstance(value, (str, int, float, bool, np.generic)) or value is None:
+        key_hash.update(repr(value).encode('utf-8'))
+    else:
+        return False
+    return True
+
+
+def _table_key(name, args, kwargs):
+    key_hash = hashlib.sha256(f'{_version}{name}'.encode('utf-8'))
+    if not _update_hash(key_hash, args) or not _update_hash(key_hash, sorted(kwargs.items())):
+        return None
+    return key_hash.hexdigest()
+
+
+def _table_path(key):
+    return os.path.join(_cache_dir, key[:2], f'{key}.html')
+
+
+def _record(name, is_hit):
+    with _lock:
+        counts = _counts[name]
+        counts['hits' if is_hit else 'misses'] += 1
+        n_calls = counts['hits'] + counts['misses']
+        hit_rate = f'{counts["hits"]}/{n_calls} ({100 * counts["hits"] / n_calls:.0f}%)'
+    utils.run_stats.set_value('html cache', name, hit_rate)
+
+
+def _read_table(path):
+    try:
+        with open(path, encoding='utf-8') as fp:
+            html = fp.read()
+    except FileNotFoundError:
+        return None
+    # Hits refresh the file age, so prune only drops tables that stopped being rendered
+    os.utime(path)
+    return html
+
+
+def _write_table(path, html):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        fp.write(html)
+    os.replace(tmp_path, path)
+
+
+def configure(settings):
+    _settings.update(settings)
+
+
+def cached(table_function):
+    name = f'{table_function.__module__.split(".")[-1]}.{table_function.__name__}'
+
+    @functools.wraps(table_function)
+    def wrapper(*args, **kwargs):
+        key = _table_key(name, args, kwargs) if _settings['enabled'] else None
+        if key is None:
+            return table_function(*args, **kwargs)
+
+        path = _table_path(key)
+        html = _read_table(path)
+        _record(name, html is not None)
+        if html is None:
+            html = table_function(*args, **kwargs)
+            _write_table(path, html)
+        return html
+
+    return wrapper
+
+
+def prune():
+    if not _settings['enabled']:
+        return
+
+    min_mtime = time.time() - _settings['max_age_days'] * 24 * 60 * 60
+    for path in glob.glob(os.path.join(_cache_dir, '*', '*.html')):
+        if os.path.getmtime(path) < min_mtime:
+            os.remove(path)
+            utils.run_stats.add('html cache', 'pruned')
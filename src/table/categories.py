@@ -5,7 +5,7 @@ from operator import itemgetter
 import numpy as np
 import pandas as pd
 
-from table import style
+from table import cache, style
 from table.common import add_position_column
 
 
@@ -81,6 +81,7 @@ def _matchup_metrics(metrics):
     return df
 
 
+@cache.cached
 def pairwise_comparisons(comparisons_data, matchups, is_opponent, n_last, less_win_categories):
     df_data = copy.deepcopy(comparisons_data)
     for team in df_data:
@@ -110,9 +111,10 @@ def pairwise_comparisons(comparisons_data, matchups, is_opponent, n_last, less_w
         set_table_attributes(table_attributes).hide().\
         apply(lambda s: style.extremum(s, best[s.name], worst[s.name]), subset=matchups).\
         map(style.percentage, subset=pd.IndexSlice[list(df_data.keys()), perc_cols])
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def each_category_stats(stats, total_comparison, matchups, less_win_categories):
     df_data = copy.deepcopy(stats)
     for team in df_data:
@@ -151,9 +153,10 @@ def each_category_stats(stats, total_comparison, matchups, less_win_categories):
         styler = styler.map(style.value, subset=pd.IndexSlice[list(df_data.keys()), ['Diff']])
     extremum_cols = [*matchups, 'Total'] if total_comparison is None else [*matchups, 'Total', 'Real']
     styler = styler.apply(extremum_lambda, subset=pd.IndexSlice[df.index, extremum_cols])
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def most_categories_stats(stats, total_comparison, matchups):
     df_data = copy.deepcopy(stats)
     res_order = ['W', 'L', 'D']
@@ -193,9 +196,10 @@ def most_categories_stats(stats, total_comparison, matchups):
         map(style.pair_result, subset=matchups)
     if total_comparison is not None:
         styler = styler.map(style.value, subset=pd.IndexSlice[list(df_data.keys()), ['Diff']])
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def matchup(stats_with_plays, places_with_plays, places_sum, categories_with_plays, less_win_categories, metrics):
     is_overall = len(set(map(itemgetter(2), stats_with_plays.keys()))) > 1
     df = pd.DataFrame(list(map(itemgetter(2, 0) if is_overall else itemgetter(0), stats_with_plays.keys())),
@@ -236,4 +240,4 @@ def matchup(stats_with_plays, places_with_plays, places_sum, categories_with_pla
         styler = styler.map(style.percentage, subset=pd.IndexSlice[df_stats.index, ['TP']])
         if 'ER' in metrics:
             styler = styler.map(style.pair_result, subset=pd.IndexSlice[df_stats.index, ['ER']])
-    return styler.to_html()
+    return style.to_html(styler)
@@ -5,7 +5,7 @@ from operator import itemgetter
 import numpy as np
 import pandas as pd
 
-from table import flag, style
+from table import cache, flag, style
 
 
 def add_position_column(df):
@@ -15,6 +15,7 @@ def add_position_column(df):
     return result_df
 
 
+@cache.cached
 def h2h(h2h_comparisons):
     h2h_sums = {}
     h2h_powers = {}
@@ -48,9 +49,10 @@ def h2h(h2h_comparisons):
     table_attributes = style.calculate_table_attributes(isSortable=False, hasPositionColumn=True)
     styler = df.style.format({'%': '{:g}'}).set_table_attributes(table_attributes).hide().\
         map(style.percentage, subset=['%'])
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def places(places_data, matchups, opp_flag, is_overall, n_last):
     df_data = copy.deepcopy(places_data)
     for team in df_data:
@@ -78,9 +80,10 @@ def places(places_data, matchups, opp_flag, is_overall, n_last):
     styler = df.style.format({c: '{:g}' for c in set(cols) - {'Team'}}).\
         set_table_attributes(table_attributes).hide().\
         apply(style.opponent_place if opp_flag else style.place, subset=matchups)
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def scores(scores_data, matchups, opp_flag, n_last):
     df_data = copy.deepcopy(scores_data)
     flags = [flag.top_score, flag.half_top_score, flag.half_bottom_score, flag.bottom_score]
@@ -112,4 +115,4 @@ def scores(scores_data, matchups, opp_flag, n_last):
     styler = df.style.format({c: '{:g}' for c in set(cols) - {'Team'}}).\
         set_table_attributes(table_attributes).hide().\
         apply(style.opponent_score if opp_flag else style.score, subset=matchups)
-    return styler.to_html()
+    return style.to_html(styler)
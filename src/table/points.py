@@ -4,10 +4,11 @@ from operator import itemgetter
 import numpy as np
 import pandas as pd
 
-from table import style
+from table import cache, style
 from table.common import add_position_column
 
 
+@cache.cached
 def luck_score(luck, matchups, opp_flag, n_last):
     df_data = copy.deepcopy(luck)
     for team in df_data:
@@ -34,9 +35,10 @@ def luck_score(luck, matchups, opp_flag, n_last):
     styler = df.style.format({c: '{:g}' for c in set(cols) - {'Team'}}).\
         set_table_attributes(table_attributes).hide().\
         map(style.opponent_luck_score if opp_flag else style.value, subset=matchups)
-    return styler.to_html()
+    return style.to_html(styler)
 
 
+@cache.cached
 def top(data, n_top, cols, drop_league_col_flag):
     df_data = sorted(data, key=itemgetter(1), reverse=True)[:n_top]
     df = pd.DataFrame(df_data, index=np.arange(n_top), columns=cols)
@@ -46,4 +48,4 @@ def top(data, n_top, cols, drop_league_col_flag):
     table_attributes = style.calculate_table_attributes(isSortable=False, hasPositionColumn=True)
     styler = df.style.format({c: '{:g}' for c in set(cols) - {'Team', 'League'}}).\
         set_table_attributes(table_attributes).hide()
-    return styler.to_html()
+    return style.to_html(styler)
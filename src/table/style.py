@@ -1,8 +1,13 @@
+import hashlib
+
 import numpy as np
 
 from table import flag
 
 
+_uuid_placeholder = 'uuid_placeholder'
+
+
 def calculate_table_attributes(isSortable, hasPositionColumn):
     attributes = '; align="center"; '
     if isSortable:
@@ -89,3 +94,10 @@ def score(s):
 def value(v):
     color = 'red' if v < 0 else 'black' if v == 0 else 'green'
     return f'color: {color}'
+
+
+def to_html(styler):
+    # Styler ids are random by default, so they are derived from the table itself to keep reports byte-stable
+    html = styler.set_uuid(_uuid_placeholder).to_html()
+    table_uuid = hashlib.sha256(html.encode('utf-8')).hexdigest()[:10]
+    return html.replace(f'T_{_uuid_placeholder}', f'T_{table_uuid}')
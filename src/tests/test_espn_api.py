@@ -0,0 +1,152 @@
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+import pytest
+
+import utils.data
+import utils.espn_api
+
+
+_fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'espn')
+_league_id = '12345'
+_sports = 'hockey'
+_fetch_settings = {
+    'max_concurrency': 2,
+    'per_host_limit': 2,
+    'parse_workers': 1,
+    'parse_queue_size': 2,
+    'retry': {'max_attempts': 1, 'base_delay': 0, 'max_delay': 0},
+    'circuit_breaker': {'failure_threshold': 8, 'reset_timeout': 900},
+}
+
+
+def _fixture_text(name):
+    with open(os.path.join(_fixtures_dir, name), encoding='utf-8') as fixture_file:
+        return fixture_file.read()
+
+
+def _page_soup(name):
+    return BeautifulSoup(_fixture_text(name), features='html.parser')
+
+
+class _LeagueHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        views = parse_qs(url.query).get('view', [])
+        if url.path == '/fhl/seasons/2024':
+            fixture_name = 'season.json'
+        elif url.path != f'/fhl/seasons/2024/segments/0/leagues/{_league_id}':
+            self.send_error(404)
+            return
+        elif 'mScoreboard' in views:
+            fixture_name = 'box_scores.json'
+            matchup_filter = json.loads(self.headers['x-fantasy-filter'])
+            self.server.box_score_matchups.append(matchup_filter['schedule']['filterMatchupPeriodIds']['value'])
+        elif 'mTeam' in views:
+            fixture_name = 'scoreboard.json'
+        else:
+            fixture_name = self.server.league_fixture
+        body = _fixture_text(fixture_name).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def today():
+    # The recorded league JSON is at scoring period 23 of the 2023-24 season
+    return datetime.date(2023, 11, 1)
+
+
+@pytest.fixture
+def league_fixture():
+    return 'league.json'
+
+
+@pytest.fixture
+def league_server(league_fixture):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _LeagueHandler)
+    server.box_score_matchups = []
+    server.league_fixture = league_fixture
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def api_source(league_server, today, monkeypatch):
+    frozen_today = classmethod(lambda cls: cls(today.year, today.month, today.day))
+    frozen_datetime = SimpleNamespace(
+        datetime=type('FrozenDatetime', (datetime.datetime,), {'today': frozen_today}),
+        timedelta=datetime.timedelta,
+        timezone=datetime.timezone,
+    )
+    monkeypatch.setattr(utils.espn_api, 'datetime', frozen_datetime)
+    monkeypatch.setattr(utils.data, 'datetime', frozen_datetime)
+    api_settings = {'url': f'http://127.0.0.1:{league_server.server_port}'}
+    return utils.espn_api.ApiSource(api_settings, _fetch_settings)
+
+
+def _page_scoreboard():
+    return utils.data._parse_scoreboard_page(_league_id, _page_soup('scoreboard_1.html'), True)
+
+
+def test_scoreboards_match_pages(api_source):
+    scoreboards = api_source.scoreboards(_sports, [(_league_id, 1)], True, {})
+
+    assert list(scoreboards) == [(_league_id, 1)]
+    _, scoreboard = scoreboards[(_league_id, 1)]
+    assert scoreboard == _page_scoreboard()
+
+
+def test_scoreboards_skip_known_hashes(api_source):
+    (page_hash, _), = api_source.scoreboards(_sports, [(_league_id, 1)], True, {}).values()
+    known_hashes = {(_league_id, 1): page_hash}
+
+    scoreboards = api_source.scoreboards(_sports, [(_league_id, 1)], True, known_hashes)
+    assert scoreboards == {(_league_id, 1): (page_hash, None)}
+
+
+def test_box_scores_match_pages(api_source, league_server):
+    matchup_scores, _, _, _ = _page_scoreboard()
+    box_scores = api_source.box_scores(_sports, [(_league_id, 1, matchup_scores, 7, 2024)], {})
+
+    page_box_scores = {}
+    for index, pair in enumerate(matchup_scores):
+        team_pair = (pair[0][0], pair[1][0])
+        page_box_scores.update(utils.data._parse_box_scores_page(team_pair, _page_soup(f'box_score_1_{index}.html')))
+    # Pages show averages in the totals row as well, the API only sums what can be summed
+    for _, _, totals in page_box_scores.values():
+        for col in utils.espn_api._not_summable_box_scores_cols:
+            totals.pop(col, None)
+
+    assert league_server.box_score_matchups == [[1]]
+    _, matchup_box_scores = box_scores[(_league_id, 1)]
+    assert matchup_box_scores == page_box_scores
+
+
+@pytest.mark.parametrize('today, league_fixture', [
+    (datetime.date(2023, 11, 1), 'league.json'),
+    (datetime.date(2023, 9, 15), 'league_preseason.json'),
+    (datetime.date(2024, 5, 1), 'league_finished.json'),
+])
+@pytest.mark.parametrize('is_playoffs_support', [True, False])
+def test_schedules_match_pages(api_source, is_playoffs_support):
+    schedules = api_source.schedules(_sports, [_league_id], is_playoffs_support)
+
+    page_schedule = utils.data._parse_schedule_page(_page_soup('schedule.html'), is_playoffs_support)
+    assert schedules == {_league_id: page_schedule}
@@ -1,4 +1,5 @@
 from collections import defaultdict
+import copy
 
 import numpy as np
 
@@ -103,23 +104,25 @@ def _update_with_quality_totals(stats, category_short):
             stats['Goals Against Average'] = gaa
 
 
-def totals_by_players(team_stats, category_short, sports):
-    stats_summarized = defaultdict(lambda: defaultdict(int))
-    for stats_item in team_stats:
-        for player, player_stats in stats_item.items():
-            for cat, cat_value in player_stats.items():
-                _add_to_category_stats(cat, cat_value, stats_summarized[player], player_stats, sports)
+def _empty_summary():
+    return {
+        'categories': defaultdict(dict),
+        'players': defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int)))),
+        'teams': defaultdict(lambda: defaultdict(lambda: defaultdict(int))),
+    }
 
-    for player_stats in stats_summarized.values():
-        _update_with_quality_totals(player_stats, category_short)
-    return stats_summarized
+
+def _add_team_stats(summary, team_key, group, team_stats, sports):
+    players_totals = summary['players'][team_key][group]
+    team_totals = summary['teams'][team_key][group]
+    for player, player_stats in team_stats.items():
+        for cat, cat_value in player_stats.items():
+            _add_to_category_stats(cat, cat_value, players_totals[player], player_stats, sports)
+            _add_to_category_stats(cat, cat_value, team_totals, player_stats, sports)
 
 
-def stats_by_team(matchups, league_box_scores, sports):
-    data_by_team = defaultdict(lambda: defaultdict(list))
-    categories_info = defaultdict(dict)
-    for m in matchups:
-        matchup_active_stats = league_box_scores[m]
+def summarize_by_team(matchup, league_box_scores, sports):
+    def update(summary, matchup_active_stats):
         for team_key, team_matchup_active_stats in matchup_active_stats.items():
             categories_data, stats_data, _ = team_matchup_active_stats
             if not categories_data or not stats_data:
@@ -127,17 +130,25 @@ def stats_by_team(matchups, league_box_scores, sports):
             for cat, stat, group in zip(categories_data, stats_data, _players_groups[sports]):
                 if not cat or not stat:
                     continue
-                categories_info[team_key][group] = cat
-                data_by_team[team_key][group].append(stat)
+                summary['categories'][team_key][group] = cat
+                _add_team_stats(summary, team_key, group, stat, sports)
+
+    # Player and team totals are summed while the matchups stream by, so no box score is kept for later
+    return league_box_scores.fold('active stats', matchup, _empty_summary, update)
 
-    return data_by_team, categories_info
+
+def totals_by_players(summary, team_key, group):
+    _, category_short = summary['categories'][team_key][group]
+    # The summary is the league's running fold, so the quality totals go into copies of the stats
+    group_totals = summary['players'][team_key][group]
+    players_totals = {player: copy.copy(player_stats) for player, player_stats in group_totals.items()}
+    for player_stats in players_totals.values():
+        _update_with_quality_totals(player_stats, category_short)
+    return players_totals
 
 
-def totals_by_team(team_stats, category_short, sports):
-    team_totals = defaultdict(int)
-    for stats_item in team_stats:
-        for player_stats in stats_item.values():
-            for cat, cat_value in player_stats.items():
-                _add_to_category_stats(cat, cat_value, team_totals, player_stats, sports)
+def totals_by_team(summary, team_key, group):
+    _, category_short = summary['categories'][team_key][group]
+    team_totals = copy.copy(summary['teams'][team_key][group])
     _update_with_quality_totals(team_totals, category_short)
     return team_totals
@@ -0,0 +1,95 @@
+import glob
+import os
+import pickle
+
+import utils.fetch
+import utils.run_stats
+import utils.store
+
+
+_src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def _code_version():
+    # Results computed by older code are never reused, whatever part of the calculation changed
+    sources = []
+    for path in sorted(glob.glob(os.path.join(_src_dir, '*.py')) + glob.glob(os.path.join(_src_dir, 'utils', '*.py'))):
+        with open(path, 'r', encoding='utf-8') as fp:
+            sources.append(fp.read())
+    return utils.fetch.content_hash(sources)
+
+
+_version = _code_version()
+
+
+def fold(aggregates, matchup, initial, update):
+    if aggregates is not None:
+        return aggregates.fold(matchup, initial, update)
+
+    state = initial()
+    for m in range(1, matchup + 1):
+        update(state, m)
+    return state
+
+
+class MatchupAggregates(object):
+    def __init__(self, league_id, season_dir, kind, league_key, matchup_keys):
+        self.__league_id = league_id
+        self.__season_dir = season_dir
+        self.__kind = kind
+        self.__league_key = league_key
+        self.__matchup_keys = matchup_keys
+        with utils.store.SeasonStore(league_id, season_dir) as store:
+            self.__saved = store.aggregate_hashes(kind)
+        self.__updated = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.save()
+
+    def __chain_hashes(self, matchup):
+        # A running total is only valid while every matchup folded into it is unchanged
+        chain_hash = utils.fetch.content_hash([_version, self.__kind, self.__league_key])
+        chain_hashes = {}
+        for m in range(1, matchup + 1):
+            matchup_key = self.__matchup_keys.get(m)
+            if chain_hash is not None and matchup_key is not None:
+                chain_hash = utils.fetch.content_hash([chain_hash, matchup_key])
+            else:
+                chain_hash = None
+            chain_hashes[m] = chain_hash
+        return chain_hashes
+
+    def __load(self, matchup):
+        if matchup in self.__updated:
+            return pickle.loads(self.__updated[matchup][1])
+
+        with utils.store.SeasonStore(self.__league_id, self.__season_dir) as store:
+            return pickle.loads(store.aggregate(self.__kind, matchup))
+
+    def fold(self, matchup, initial, update):
+        chain_hashes = self.__chain_hashes(matchup)
+        saved_matchups = [m for m, chain_hash in chain_hashes.items()
+                          if chain_hash is not None and self.__saved.get(m) == chain_hash]
+        start = max(saved_matchups, default=0)
+        state = self.__load(start) if start else initial()
+
+        for m in range(start + 1, matchup + 1):
+            update(state, m)
+            if chain_hashes[m] is not None:
+                self.__saved[m] = chain_hashes[m]
+                self.__updated[m] = (chain_hashes[m], pickle.dumps(state))
+        utils.run_stats.add('aggregates', f'{self.__kind} reused', start)
+        utils.run_stats.add('aggregates', f'{self.__kind} calculated', matchup - start)
+        return state
+
+    def save(self):
+        if not self.__updated:
+            return
+
+        with utils.store.SeasonStore(self.__league_id, self.__season_dir) as store:
+            store.save_aggregates(self.__kind, self.__updated)
+        self.__updated = {}
@@ -0,0 +1,68 @@
+from collections import defaultdict
+import datetime
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+
+
+_offline_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+_archive_name = 'pages.jsonl.gz'
+_lock = threading.Lock()
+
+
+def _season_dir(league_id, sports):
+    today = datetime.datetime.today().date()
+    season_start_year = today.year if today.month > 6 else today.year - 1
+    season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
+    return os.path.join(_offline_data_dir, sports, league_id, season_str)
+
+
+def page_record(url, page, league_id, matchup, html_fragments, **params):
+    record = {
+        'url': url,
+        'fetched_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'page': page,
+        'league_id': league_id,
+        'matchup': matchup,
+        'html': ''.join(str(fragment) for fragment in html_fragments),
+    }
+    record.update(params)
+    return record
+
+
+def append(sports, records):
+    league_records = defaultdict(list)
+    for record in records:
+        league_records[record['league_id']].append(record)
+
+    with _lock:
+        for league_id, records_to_save in league_records.items():
+            season_dir = _season_dir(league_id, sports)
+            os.makedirs(season_dir, exist_ok=True)
+            # Every append adds a new gzip member, so existing records are never rewritten
+            with gzip.open(os.path.join(season_dir, _archive_name), 'at', encoding='utf-8') as fp:
+                for record in records_to_save:
+                    fp.write(json.dumps(record) + '\n')
+
+
+def season_dirs():
+    archive_paths = glob.glob(os.path.join(_offline_data_dir, '*', '*', '*', _archive_name))
+    return sorted(os.path.dirname(path) for path in archive_paths)
+
+
+def latest_pages(season_dir):
+    pages = {}
+    archive_path = os.path.join(season_dir, _archive_name)
+    try:
+        with gzip.open(archive_path, 'rt', encoding='utf-8') as fp:
+            for line in fp:
+                record = json.loads(line)
+                key = (record['page'], record['matchup'], record.get('index', -1))
+                if key not in pages or pages[key]['fetched_at'] <= record['fetched_at']:
+                    pages[key] = record
+    except (EOFError, json.JSONDecodeError) as e:
+        print(f'[Archive] Truncated archive {archive_path}, using records read so far: {e}', file=sys.stderr)
+    return pages
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from concurrent.futures import Future
+import json
+import queue
+import sys
+import threading
+import time
+
+import psutil
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver import Chrome
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+import utils.run_stats
+import utils.throttle
+
+
+def _record_network_log(performance_log):
+    for entry in performance_log:
+        message = json.loads(entry['message'])['message']
+        params = message.get('params', {})
+        if message['method'] == 'Network.loadingFailed' and params.get('blockedReason'):
+            utils.run_stats.add('lean profile', f'blocked {params.get("type", "Other").lower()}')
+            utils.run_stats.add('lean profile', 'blocked requests')
+        elif message['method'] == 'Network.loadingFinished':
+            utils.run_stats.add('lean profile', 'passed requests')
+            utils.run_stats.add('lean profile', 'passed bytes', params.get('encodedDataLength', 0))
+
+
+def _process_tree_rss(pid):
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0
+
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+class BrowserManager(object):
+    def __init__(self, recycling_settings, rate_limit_settings, lean_profile_settings):
+        self.__options = Options()
+        self.__options.add_argument('--ignore-certificate-errors')
+        self.__options.page_load_strategy = 'eager'
+        self.__lean_profile_settings = lean_profile_settings
+        if lean_profile_settings['enabled']:
+            self.__options.add_argument('--blink-settings=imagesEnabled=false')
+            self.__options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+            self.__options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+        self.__recycling_settings = recycling_settings
+        self.__rate_limit_settings = rate_limit_settings
+        self.__loadTimeout = 30
+        # Chrome is launched by the first page read, so runs served from offline data never start it
+        self.__browser = None
+        self.__startup_seconds = None
+
+    def __start(self):
+        start_time = time.monotonic()
+        self.__browser = Chrome(options=self.__options)
+        self.__pageCount = 0
+        self.__load_times = []
+        self.__recent_load_time = None
+        self.__browser.set_page_load_timeout(self.__loadTimeout)
+        if self.__lean_profile_settings['enabled']:
+            self.__browser.execute_cdp_cmd('Network.enable', {})
+            self.__browser.execute_cdp_cmd(
+                'Network.setBlockedURLs', {'urls': self.__lean_profile_settings['blocked_urls']})
+        self.__startup_seconds = time.monotonic() - start_time
+        utils.run_stats.add('browser startup', 'launches')
+        utils.run_stats.add('browser startup', 'startup seconds', round(self.__startup_seconds, 2))
+
+    def is_started(self):
+        return self.__browser is not None
+
+    def startup_seconds(self):
+        return self.__startup_seconds
+
+    def __record_load_time(self, load_time):
+        baseline_pages = self.__recycling_settings['baseline_pages']
+        if len(self.__load_times) < baseline_pages:
+            self.__load_times.append(load_time)
+            return
+
+        smoothing = self.__recycling_settings['latency_smoothing']
+        if self.__recent_load_time is None:
+            self.__recent_load_time = load_time
+        else:
+            self.__recent_load_time = smoothing * load_time + (1 - smoothing) * self.__recent_load_time
+
+    def __recycle_reason(self):
+        if self.__pageCount >= self.__recycling_settings['max_pages']:
+            return 'page limit'
+
+        rss_mb = _process_tree_rss(self.__browser.service.process.pid) / 2 ** 20
+        peak_rss_mb = utils.run_stats.get('browser recycling', 'peak rss mb')
+        utils.run_stats.set_value('browser recycling', 'peak rss mb', max(peak_rss_mb, round(rss_mb)))
+        if rss_mb > self.__recycling_settings['max_rss_mb']:
+            return 'memory'
+
+        if self.__recent_load_time is not None:
+            baseline_load_time = sum(self.__load_times) / len(self.__load_times)
+            if self.__recent_load_time > baseline_load_time * self.__recycling_settings['latency_drift']:
+                return 'latency drift'
+        return None
+
+    def __recycle_if_needed(self):
+        reason = self.__recycle_reason()
+        if reason is None:
+            return
+
+        utils.run_stats.add('browser recycling', 'recycles')
+        utils.run_stats.add('browser recycling', f'recycles by {reason}')
+        utils.run_stats.add('browser recycling', 'pages before recycle', self.__pageCount)
+        self.clear()
+        self.__start()
+
+    def read_page_source(self, url, ready_selector=None):
+        if self.__browser is None:
+            self.__start()
+        self.__recycle_if_needed()
+        limiter = utils.throttle.host_limiter(url, self.__rate_limit_settings)
+        limiter.acquire()
+        try:
+            load_start = time.monotonic()
+            self.__browser.get(url)
+            if ready_selector is not None:
+                WebDriverWait(self.__browser, self.__loadTimeout).until(
+                    expected_conditions.presence_of_element_located((By.CSS_SELECTOR, ready_selector)))
+            self.__record_load_time(time.monotonic() - load_start)
+            limiter.on_success()
+        except TimeoutException as e:
+            print(f'[Timeout] Page load exceeded limit for {url}: {e}', file=sys.stderr)
+            limiter.on_failure()
+            # Stop further resource loading so browser doesn't hang
+            self.__browser.execute_script('window.stop();')
+        except WebDriverException as e:
+            print(f'[WebDriver error] Could not load {url}: {e}', file=sys.stderr)
+            limiter.on_failure()
+            # Optionally stop loading here too
+            self.__browser.execute_script('window.stop();')
+
+        self.__pageCount += 1
+        if self.__lean_profile_settings['enabled']:
+            _record_network_log(self.__browser.get_log('performance'))
+        return self.__browser.page_source
+
+    def clear(self):
+        if self.__browser is not None:
+            self.__browser.quit()
+            self.__browser = None
+
+    def __del__(self):
+        self.clear()
+
+
+class BrowserPool(object):
+    def __init__(self, n_browsers, recycling_settings, rate_limit_settings, lean_profile_settings):
+        self.__tasks = queue.Queue()
+        self.__workers = []
+        self.__lock = threading.Lock()
+        self.__job_launches = defaultdict(list)
+        for _ in range(n_browsers):
+            browser = BrowserManager(recycling_settings, rate_limit_settings, lean_profile_settings)
+            worker = threading.Thread(target=self.__work, args=(browser,), daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def __work(self, browser):
+        try:
+            while True:
+                task = self.__tasks.get()
+                if task is None:
+                    break
+
+                url, ready_selector, job, future = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                is_started = browser.is_started()
+                try:
+                    future.set_result(browser.read_page_source(url, ready_selector))
+                except Exception as e:
+                    future.set_exception(e)
+                if not is_started and browser.is_started():
+                    with self.__lock:
+                        self.__job_launches[job].append(browser.startup_seconds())
+        finally:
+            browser.clear()
+
+    def submit(self, url, ready_selector=None, job=None):
+        future = Future()
+        self.__tasks.put((url, ready_selector, job, future))
+        return future
+
+    def read_page_source(self, url, ready_selector=None, job=None):
+        return self.submit(url, ready_selector, job).result()
+
+    def job_launches(self, job):
+        with self.__lock:
+            return list(self.__job_launches[job])
+
+    def clear(self):
+        for _ in self.__workers:
+            self.__tasks.put(None)
+        for worker in self.__workers:
+            worker.join()
+        self.__workers = []
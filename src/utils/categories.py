@@ -1,75 +1,242 @@
 from collections import Counter, defaultdict
-import itertools
 
 import numpy as np
 
+import utils.aggregates
 import utils.common
 import utils.data
+import utils.season_cube
+import utils.teams
 
 
 _gk_category_lowers = {'GAA': np.inf, 'SV%': -np.inf, 'GA': np.inf}
+_max_comparison_size = 2 ** 22
+_pair_result_names = {1: 'W', -1: 'L', 0: 'D'}
+
+
+def _stats_values(stats, categories):
+    return np.array(
+        [[utils.season_cube.stat_value(value) for value in stats[team][:len(categories)]] for team in stats],
+        dtype=float).reshape(len(stats), len(categories))
+
+
+def _category_expectations(values, categories, less_win_categories):
+    # Teams are on the first axis and categories on the last one, teams without a value are left out
+    (first_indexes, last_indexes), _ = utils.common.tie_ranges(values, False)
+    is_played = ~np.isnan(values)
+    n_played = np.sum(is_played, axis=0)
+    n_lower = first_indexes
+    n_higher = n_played - 1 - last_indexes
+    is_less_win = np.array([cat in less_win_categories for cat in categories], dtype=bool)
+    counts = np.stack([
+        np.where(is_less_win, n_higher, n_lower),
+        np.where(is_less_win, n_lower, n_higher),
+        last_indexes - first_indexes,
+    ], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expectations = counts / (n_played - 1)[..., np.newaxis]
+    return np.where(is_played[..., np.newaxis], expectations, 0.0)
+
+
+def _sum_expectations(expectations):
+    # Categories are added one by one, so the sums do not depend on the number of matchups in the call
+    expected_score = np.zeros(expectations.shape[:-2] + (3,))
+    for index in range(expectations.shape[-2]):
+        expected_score += expectations[..., index, :]
+    return expected_score
 
 
-def _get_category_expectation(score_pairs, category, less_win_categories):
-    scores = np.array([score for _, score in score_pairs])
-    norm_coeff = len(scores) - 1
-    result = {}
-    for team, sc in score_pairs:
-        counts = np.array([np.sum(scores < sc), np.sum(scores > sc), np.sum(scores == sc) - 1])
-        res_slice = [1, 0, 2] if category in less_win_categories else [0, 1, 2]
-        result[team] = counts[res_slice] / norm_coeff
-    return result
-
+def _matchup_category_places(stats, categories, less_win_categories, opponent_dict):
+    places_data = get_places_data(stats, categories, less_win_categories)
+    matchup_places = []
+    for team in places_data:
+        win_stats = [
+            (np.sign(opponent_place - place) + 1) / 2 # 1 for win, 0.5 for draw, 0 for lose
+            for place, opponent_place in zip(places_data[team], places_data[opponent_dict[team]])
+        ]
+        matchup_places.append((team, places_data[team], win_stats))
+    return matchup_places
+
+
+def _fold_category_places(state, m, category_pairs, less_win_categories, cube):
+    matchup_pairs, categories = category_pairs[m]
+    opponent_dict = utils.common.get_opponent_dict(matchup_pairs)
+    stats = get_matchup_stats(m, matchup_pairs, categories, cube)
+    for team, places, win_stats in _matchup_category_places(stats, categories, less_win_categories, opponent_dict):
+        for cat, place, win_stat in zip(categories, places, win_stats):
+            state['category_places'].setdefault(cat, {}).setdefault(team, []).append(place)
+            state['category_win_stats'].setdefault(cat, {}).setdefault(team, []).append(win_stat)
+    state['categories'] = categories
+
+
+def get_each_category_stats(matchups, category_pairs, less_win_categories, cube=None, aggregates=None):
+    state = utils.aggregates.fold(
+        aggregates, max(matchups), lambda: {'categories': None, 'category_places': {}, 'category_win_stats': {}},
+        lambda state, m: _fold_category_places(state, m, category_pairs, less_win_categories, cube))
 
-def get_each_category_stats(matchups, category_pairs, less_win_categories):
     category_places = defaultdict(lambda: defaultdict(list))
     category_win_stats = defaultdict(lambda: defaultdict(list))
-    for m in matchups:
-        matchup_pairs, categories = category_pairs[m]
-        opponent_dict = utils.common.get_opponent_dict(matchup_pairs)
-        stats = get_stats(matchup_pairs)
-        places_data = get_places_data(stats, categories, less_win_categories)
-        for team in places_data:
-            for cat, place, opponent_place in zip(categories, places_data[team], places_data[opponent_dict[team]]):
-                category_places[cat][team].append(place)
-                win_stat = (np.sign(opponent_place - place) + 1) / 2 # 1 for win, 0.5 for draw, 0 for lose
-                category_win_stats[cat][team].append(win_stat)
+    for cat in state['category_places']:
+        category_places[cat].update(state['category_places'][cat])
+        category_win_stats[cat].update(state['category_win_stats'][cat])
+    return state['categories'], category_places, category_win_stats
+
+
+def get_cumulative_places(places_by_categories, n_matchups):
+    team_indexes = utils.teams.season_indexes(places_by_categories.values())
+    team_rows = utils.teams.rows(team_indexes)
+    places_sums = np.zeros((len(team_indexes), len(places_by_categories), n_matchups))
+    n_places = np.zeros((len(team_indexes), len(places_by_categories), 1), dtype=int)
+    for index, category_places in enumerate(places_by_categories.values()):
+        category_rows = team_rows[utils.teams.key_indexes(category_places)]
+        for row, places in zip(category_rows, category_places.values()):
+            team_places_sums = np.cumsum(places[:n_matchups])
+            places_sums[row, index, :len(team_places_sums)] = team_places_sums
+            places_sums[row, index, len(team_places_sums):] = team_places_sums[-1:]
+            n_places[row, index] = len(team_places_sums)
+    # Places are multiples of 0.5, so the prefix sums are exact and the means equal np.mean over each prefix
+    return team_indexes, places_sums / np.minimum(n_places, np.arange(1, n_matchups + 1))
+
+
+def _places_records(places, axis):
+    team_places = places[:, np.newaxis]
+    opponent_places = places[np.newaxis]
+    return np.stack([
+        np.sum(team_places < opponent_places, axis=axis),
+        np.sum(team_places > opponent_places, axis=axis),
+        np.sum(team_places == opponent_places, axis=axis),
+    ], axis=-1)
+
+
+def _teams_records(team_indexes, records):
+    teams = [utils.teams.key(team_index) for team_index in team_indexes]
+    return {
+        team: {
+            opponent: records[row, opponent_row] for opponent_row, opponent in enumerate(teams) if opponent_row != row
+        }
+        for row, team in enumerate(teams)
+    }
 
-    return categories, category_places, category_win_stats
+
+def get_power_predictions(places_by_categories, matchups):
+    team_indexes, cumulative_places = get_cumulative_places(places_by_categories, max(matchups))
+    return _teams_records(team_indexes, _places_records(cumulative_places[:, :, np.asarray(matchups) - 1], axis=2))
+
+
+def get_h2h_category_records(places_by_categories, n_last):
+    team_indexes = utils.teams.season_indexes(places_by_categories.values())
+    team_rows = utils.teams.rows(team_indexes)
+    n_matchups = max([len(places) for category_places in places_by_categories.values()
+                      for places in category_places.values()], default=0)
+    places = np.zeros((len(team_indexes), len(places_by_categories), n_matchups))
+    for index, category_places in enumerate(places_by_categories.values()):
+        places[team_rows[utils.teams.key_indexes(category_places)], index] = list(category_places.values())
+    # Season and recent records are stacked, so each opponent slice unpacks into both
+    records = np.stack([_places_records(places, axis=3), _places_records(places[:, :, -n_last:], axis=3)], axis=2)
+    return _teams_records(team_indexes, records)
+
+
+def get_pair_results(stats, categories, less_win_categories, tiebreaker):
+    teams = list(stats)
+    values = _stats_values(stats, categories)
+    # Weights are scaled to integers, so the tiebreaker decides only otherwise equal pairs and sums stay exact
+    weights = np.array([
+        (101 if cat == tiebreaker else 100) * (-1 if cat in less_win_categories else 1) for cat in categories
+    ], dtype=np.int64)
+
+    # Row team result against column team: 1 for win, -1 for lose, 0 for draw
+    results = np.zeros((len(teams), len(teams)), dtype=np.int8)
+    chunk_size = max(1, _max_comparison_size // max(1, len(teams) * len(categories)))
+    for start in range(0, len(teams), chunk_size):
+        chunk_values = values[start:start + chunk_size, np.newaxis, :]
+        signs = (chunk_values > values).astype(np.int64) - (chunk_values < values)
+        results[start:start + chunk_size] = np.sign(signs @ weights)
+    return teams, results
+
+
+def get_opponent_results(teams, results, opponent_dict):
+    team_indexes = {team: index for index, team in enumerate(teams)}
+    return {
+        team: _pair_result_names[results[index, team_indexes[opponent_dict[team]]]]
+        for index, team in enumerate(teams)
+    }
 
 
 def get_comparison_stats(stats, categories, less_win_categories, tiebreaker):
-    team_win_stats = defaultdict(Counter)
-    for team, opponent in itertools.combinations(stats.keys(), 2):
-        team_result, opponent_result = get_pair_result(
-            stats[team], stats[opponent], categories, less_win_categories, tiebreaker)
-        team_win_stats[team][team_result] += 1
-        team_win_stats[opponent][opponent_result] += 1
+    return count_pair_results(*get_pair_results(stats, categories, less_win_categories, tiebreaker))
+
+
+def count_pair_results(teams, results):
+    if len(teams) < 2:
+        return {}
+
+    wins = np.sum(results == 1, axis=1).tolist()
+    loses = np.sum(results == -1, axis=1).tolist()
+    draws = (np.sum(results == 0, axis=1) - 1).tolist()
+    return {team: [wins[index], loses[index], draws[index]] for index, team in enumerate(teams)}
 
-    comparison_stats = {}
-    for team, win_stats in team_win_stats.items():
-        comparison_stats[team] = [win_stats['W'], win_stats['L'], win_stats['D']]
-    return comparison_stats
+
+def get_h2h_comparisons(matchups_pair_results):
+    team_indexes = utils.teams.season_indexes(teams for teams, _ in matchups_pair_results)
+    team_rows = utils.teams.rows(team_indexes)
+    counts = {result: np.zeros((len(team_indexes), len(team_indexes)), dtype=int) for result in ['W', 'L', 'D']}
+    for teams, results in matchups_pair_results:
+        matchup_rows = team_rows[utils.teams.key_indexes(teams)]
+        indexes = np.ix_(matchup_rows, matchup_rows)
+        for value, result in _pair_result_names.items():
+            counts[result][indexes] += results == value
+
+    teams = [utils.teams.key(team_index) for team_index in team_indexes]
+    comparisons_h2h = defaultdict(lambda: defaultdict(Counter))
+    for row, team in enumerate(teams):
+        for opponent_row, opponent in enumerate(teams):
+            pair_counts = {result: int(counts[result][row, opponent_row]) for result in counts}
+            if row != opponent_row and any(pair_counts.values()):
+                comparisons_h2h[team][opponent] = +Counter(pair_counts)
+    return comparisons_h2h
 
 
 def get_expected_score(stats, categories, less_win_categories):
-    expected_score = {team: np.array([0.0, 0.0, 0.0]) for team in stats}
-    for i, cat in enumerate(categories):
-        pairs = [(team, stats[team][i]) for team in stats]
-        expected_stats = _get_category_expectation(pairs, cat, less_win_categories)
-        for team in expected_stats:
-            expected_score[team] += expected_stats[team]
-    return expected_score
+    expectations = _category_expectations(_stats_values(stats, categories), categories, less_win_categories)
+    expected_score = _sum_expectations(expectations)
+    return {team: expected_score[index] for index, team in enumerate(stats)}
 
 
 def get_tiebreaker_expectation(stats, categories, less_win_categories, tiebreaker):
     if tiebreaker not in categories:
         return {team: np.array([0.0, 0.0, 0.0]) for team in stats}
 
-    tiebreaker_index = categories.index(tiebreaker)
-    pairs = [(team, stats[team][tiebreaker_index]) for team in stats]
-    tiebreaker_stats = _get_category_expectation(pairs, tiebreaker, less_win_categories)
-    return tiebreaker_stats
+    values = _stats_values(stats, categories)[:, [categories.index(tiebreaker)]]
+    tiebreaker_stats = _category_expectations(values, [tiebreaker], less_win_categories)
+    return {team: tiebreaker_stats[index, 0] for index, team in enumerate(stats)}
+
+
+def get_season_expectations(matchups_stats, less_win_categories, tiebreaker):
+    team_indexes = utils.teams.season_indexes(stats for stats, _ in matchups_stats)
+    team_rows = utils.teams.rows(team_indexes)
+    category_indexes = {}
+    for _, categories in matchups_stats:
+        for cat in categories:
+            category_indexes.setdefault(cat, len(category_indexes))
+
+    matchups_rows = [team_rows[utils.teams.key_indexes(stats)] for stats, _ in matchups_stats]
+    values = np.full((len(team_indexes), len(matchups_stats), len(category_indexes)), np.nan)
+    for index, ((stats, categories), rows) in enumerate(zip(matchups_stats, matchups_rows)):
+        columns = [category_indexes[cat] for cat in categories]
+        values[np.ix_(rows, [index], columns)] = _stats_values(stats, categories)[:, np.newaxis]
+    expectations = _category_expectations(values, list(category_indexes), less_win_categories)
+    expected_scores = _sum_expectations(expectations)
+
+    season_expectations = []
+    for index, ((stats, categories), rows) in enumerate(zip(matchups_stats, matchups_rows)):
+        expected_score = {team: expected_scores[row, index] for team, row in zip(stats, rows)}
+        if tiebreaker in categories:
+            tiebreaker_column = category_indexes[tiebreaker]
+            tiebreaker_stats = {team: expectations[row, index, tiebreaker_column] for team, row in zip(stats, rows)}
+        else:
+            tiebreaker_stats = {team: np.array([0.0, 0.0, 0.0]) for team in stats}
+        season_expectations.append((expected_score, tiebreaker_stats))
+    return season_expectations
 
 
 def get_expected_result(expected_score, tiebreaker_stats, opponents_dict):
@@ -89,34 +256,19 @@ def get_expected_result(expected_score, tiebreaker_stats, opponents_dict):
     return expected_result
 
 
-def get_pair_result(team_stats, opponent_stats, categories, less_win_categories, tiebreaker):
-    win_count = 0
-    lose_count = 0
-    for index, cat in enumerate(categories):
-        cat_value_coeff = 1.0 if cat != tiebreaker else 1.01
-        if team_stats[index] > opponent_stats[index]:
-            lose_count += (cat in less_win_categories) * cat_value_coeff
-            win_count += (cat not in less_win_categories) * cat_value_coeff
-        elif team_stats[index] < opponent_stats[index]:
-            lose_count += (cat not in less_win_categories) * cat_value_coeff
-            win_count += (cat in less_win_categories)  * cat_value_coeff
-    team_result = 'D' if win_count == lose_count else 'W' if win_count > lose_count else 'L'
-    opponent_result = 'D' if win_count == lose_count else 'L' if win_count > lose_count else 'W'
-    return team_result, opponent_result
-
-
 def get_places_data(stats, categories, less_win_categories):
-    places_data = defaultdict(list)
-    for index, cat in enumerate(categories):
-        cat_scores = {team: stats[team][index] for team in stats}
-        places = utils.common.get_places(cat_scores, cat not in less_win_categories)
-        for team in places:
-            places_data[team].append(places[team])
-    return places_data
+    if not categories or not stats:
+        return defaultdict(list)
 
+    teams = list(stats)
+    values = _stats_values(stats, categories)
+    reverse = np.array([cat not in less_win_categories for cat in categories])
+    places, order = utils.common.rank_places(values, reverse)
+    return defaultdict(list, {teams[index]: list(places[index]) for index in order[:, 0]})
 
-def get_places_sum(matchup_pairs, categories, less_win_categories):
-    stats = get_stats(matchup_pairs)
+
+def get_places_sum(matchup_pairs, categories, less_win_categories, stats=None):
+    stats = get_stats(matchup_pairs) if stats is None else stats
     places_data = get_places_data(stats, categories, less_win_categories)
     return {team: np.sum(places_data[team]) for team in places_data}
 
@@ -129,6 +281,12 @@ def get_stats(results):
     return stats
 
 
+def get_matchup_stats(m, matchup_pairs, categories, cube):
+    if cube is None:
+        return get_stats(matchup_pairs)
+    return cube.matchup_stats(m, [team for pair in matchup_pairs for team, _ in pair], categories)
+
+
 def join_stats_and_plays(stats, plays):
     if plays is None:
         return stats
@@ -185,6 +343,36 @@ def _apply_activation_pairs(matchup_pairs, matchup, settings, stats):
     return pairs_updated
 
 
+def apply_activation_cube(cube, matchup, league_box_scores, group_settings, schedule):
+    if cube is None:
+        return None
+
+    matchups = range(1, matchup + 1)
+    settings = _activation_settings(group_settings, matchups, schedule)
+    stats = _activation_stats(league_box_scores, matchups)
+    gk_columns = [(cube.category_index[cat], lower) for cat, lower in _gk_category_lowers.items()
+                  if cat in cube.category_index]
+    if settings is None or stats is None or not gk_columns:
+        return cube
+
+    is_lowered = np.zeros(cube.values.shape[:2], dtype=bool)
+    for m in matchups:
+        gk_games = stats['goalkeeper_games'][m]
+        if not gk_games:
+            continue
+        for team, team_gk_games in gk_games.items():
+            if team_gk_games < settings['goalkeeper_games'][m] and team[1] in cube.team_index:
+                is_lowered[cube.team_index[team[1]], m - 1] = True
+    if not np.any(is_lowered):
+        return cube
+
+    lowers = np.full(len(cube.category_index), np.nan)
+    for column, lower in gk_columns:
+        lowers[column] = lower
+    return utils.season_cube.SeasonCube(
+        np.asarray(cube.values), cube.team_index, cube.category_index, (is_lowered, lowers))
+
+
 def _activation_settings(group_settings, matchups, schedule):
     if 'gk_threshold' not in group_settings:
         return None
@@ -204,7 +392,7 @@ def _activation_stats(league_box_scores, matchups):
         return None
 
     return {
-        'goalkeeper_games': {m: utils.data.goalkeeper_games(league_box_scores[m]) for m in matchups}
+        'goalkeeper_games': {m: utils.data.goalkeeper_games(league_box_scores.totals(m)) for m in matchups}
     }
 
 
@@ -229,20 +417,7 @@ def apply_activation_scoreboards(scoreboards, box_scores, group_settings, schedu
     return scoreboards_activated
 
 
-def cumulative_matchup_table_places(matchups, category_pairs, less_win_categories):
-    places = defaultdict(list)
-    opponent_places = defaultdict(list)
-    for m in matchups:
-        stats_pairs, categories = category_pairs[m]
-        opponent_dict = utils.common.get_opponent_dict(stats_pairs)
-        matchup_places_sum = get_places_sum(stats_pairs, categories, less_win_categories)
-        matchup_places = utils.common.get_places(matchup_places_sum, False)
-
-        for team, matchup_team_place in matchup_places.items():
-            places[team].append(matchup_team_place)
-
-            opponent = opponent_dict[team]
-            matchup_opponent_place = matchup_places[opponent]
-            opponent_places[team].append(matchup_opponent_place)
-
-    return places, opponent_places
+def matchup_table_places(stats, categories, less_win_categories):
+    places_data = get_places_data(stats, categories, less_win_categories)
+    places_sum = {team: np.sum(places_data[team]) for team in places_data}
+    return utils.common.get_places(places_sum, False)
@@ -1,12 +1,15 @@
 from collections import defaultdict
 import datetime
-from operator import itemgetter
+import hashlib
 import os
 import re
+import threading
 
 from jinja2 import Template
 import numpy as np
 
+import utils.run_stats
+from utils.json_utils import dump as json_dump
 from utils.json_utils import load as json_load
 
 
@@ -17,6 +20,10 @@ _sports_to_display = {
     'basketball': 'NBA',
 }
 _global_resources_keys = ['category_names', 'config', 'descriptions', 'titles']
+_output_manifest_path = os.path.join(_repo_root_dir, 'data', 'output_manifest.json')
+_output_lock = threading.Lock()
+_output_manifest = None
+_changed_outputs = []
 
 
 def load_global_resources():
@@ -48,8 +55,49 @@ def _save_html(template_name, template_params, html_path):
     with open(template_path, 'r', encoding='utf-8') as template_fp:
         template = Template(template_fp.read())
     html_str = template.render(template_params)
-    with open(html_path, 'w', encoding='utf-8') as html_fp:
-        html_fp.write(html_str)
+    _write_if_changed(html_path, html_str)
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _is_output_unchanged(path, manifest_entry, content_hash):
+    if manifest_entry is None or manifest_entry[0] != content_hash or not os.path.isfile(path):
+        return False
+    stat = os.stat(path)
+    if [stat.st_size, stat.st_mtime_ns] == manifest_entry[1:]:
+        return True
+    # The file was touched outside of this writer (e.g. by git checkout), so its content decides
+    with open(path, 'r', encoding='utf-8') as fp:
+        return _text_hash(fp.read()) == content_hash
+
+
+def _write_if_changed(path, text):
+    global _output_manifest
+    content_hash = _text_hash(text)
+    manifest_key = os.path.relpath(path, os.path.join(_repo_root_dir, '..'))
+    with _output_lock:
+        if _output_manifest is None:
+            _output_manifest = json_load(_output_manifest_path, {})
+        manifest_entry = _output_manifest.get(manifest_key)
+        if _is_output_unchanged(path, manifest_entry, content_hash):
+            utils.run_stats.add('output', 'unchanged files')
+        else:
+            with open(path, 'w', encoding='utf-8') as fp:
+                fp.write(text)
+            _changed_outputs.append(os.path.abspath(path))
+            utils.run_stats.add('output', 'written files')
+        stat = os.stat(path)
+        _output_manifest[manifest_key] = [content_hash, stat.st_size, stat.st_mtime_ns]
+
+
+def save_output_manifest():
+    with _output_lock:
+        if _output_manifest is not None:
+            os.makedirs(os.path.dirname(_output_manifest_path), exist_ok=True)
+            json_dump(_output_manifest, _output_manifest_path)
+        return sorted(set(_changed_outputs))
 
 
 def _get_previous_reports(index_relative_path, matchup, schedule, github):
@@ -95,14 +143,44 @@ def get_opponent_dict(scores_pairs):
     return opp_dict
 
 
+def tie_ranges(values, reverse):
+    # Sorted positions along the first axis of the first and the last value equal to every value
+    values = np.asarray(values, dtype=float)
+    keys = np.where(reverse, -values, values)
+    order = np.argsort(keys, axis=0, kind='stable')
+    sorted_keys = np.take_along_axis(keys, order, axis=0)
+
+    n_teams = len(values)
+    indexes = np.arange(n_teams).reshape((-1,) + (1,) * (values.ndim - 1))
+    is_first = np.ones(sorted_keys.shape, dtype=bool)
+    is_first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    is_last = np.ones(sorted_keys.shape, dtype=bool)
+    is_last[:-1] = is_first[1:]
+    first_indexes = np.maximum.accumulate(np.where(is_first, indexes, 0), axis=0)
+    last_indexes = np.minimum.accumulate(np.where(is_last, indexes, n_teams - 1)[::-1], axis=0)[::-1]
+
+    ranges = np.empty((2,) + sorted_keys.shape, dtype=int)
+    np.put_along_axis(ranges[0], order, first_indexes, axis=0)
+    np.put_along_axis(ranges[1], order, last_indexes, axis=0)
+    return ranges, order
+
+
+def rank_places(values, reverse):
+    # Equal values share the mean of their sorted positions
+    (first_indexes, last_indexes), order = tie_ranges(values, reverse)
+    return 1 + (first_indexes + last_indexes) / 2, order
+
+
 def get_places(scores_dict, reverse):
-    sorted_scores = sorted(scores_dict.items(), key=itemgetter(1), reverse=reverse)
-    only_scores_array = np.array(list(map(itemgetter(1), sorted_scores)))
-    places = {}
-    for team, score in sorted_scores:
-        score_indexes = np.where(only_scores_array == score)
-        places[team] = 1 + np.mean(score_indexes)
-    return places
+    teams = list(scores_dict)
+    places, order = rank_places([scores_dict[team] for team in teams], reverse)
+    return {teams[index]: places[index] for index in order}
+
+
+def get_places_rows(scores_rows, reverse):
+    teams = list(scores_rows)
+    places, order = rank_places([scores_rows[team] for team in teams], reverse)
+    return {teams[index]: list(places[index]) for index in order[:, 0]}
 
 
 def save_archive(global_config, league_names):
@@ -246,21 +324,30 @@ def save_league_index(league_name, group_settings, global_config):
         _save_html('league_home', template_params, league_home_path)
 
 
-def save_tables(group_settings, matchup, schedule, global_config, report_type, params):
+def _season_reports_dir(group_settings, global_config, report_type):
     today = datetime.datetime.today().date()
     season_start_year = today.year if today.month > 6 else today.year - 1
     season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
 
+    repo_name = global_config[report_type]['repo_name']
+    dir_name = global_config[report_type]['dir_name']
+    sports = group_settings['sports']
+    main_league = group_settings['leagues'][0]
+    return os.path.join(repo_name, dir_name, sports, main_league, season_str)
+
+
+def is_report_saved(group_settings, matchup, global_config, report_type):
+    season_reports_dir = _season_reports_dir(group_settings, global_config, report_type)
+    return os.path.isfile(os.path.join(_repo_root_dir, '..', season_reports_dir, f'matchup_{matchup}.html'))
+
+
+def save_tables(group_settings, matchup, schedule, global_config, report_type, params):
     main_github = global_config['main_github']
     main_repo = global_config['main_repo']
     main_index_url = f'https://{main_github}.github.io/{main_repo}/homepage.html'
 
     github = global_config[report_type]['github']
-    repo_name = global_config[report_type]['repo_name']
-    dir_name = global_config[report_type]['dir_name']
-    sports = group_settings['sports']
-    main_league = group_settings['leagues'][0]
-    season_reports_dir = os.path.join(repo_name, dir_name, sports, main_league, season_str)
+    season_reports_dir = _season_reports_dir(group_settings, global_config, report_type)
     previous_reports = _get_previous_reports(season_reports_dir, matchup, schedule, github)
     template_params = {
         'header': f'Fantasy Fun Stuff ({report_type})',
@@ -1,67 +1,33 @@
-from collections import defaultdict
+from collections import Counter, defaultdict, OrderedDict
+from collections.abc import Mapping
 import datetime
+import glob
+import multiprocessing
+from operator import itemgetter
 import os
 import pickle
 import re
-import sys
-import time
 
 from bs4 import BeautifulSoup
 import numpy as np
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver import Chrome
-from selenium.webdriver.chrome.options import Options
 
+import utils.aggregates
+import utils.archive
 import utils.categories
-
-
-class BrowserManager(object):
-    def __init__(self, page_limit, sleep_timeout):
-        self.__options = Options()
-        self.__options.add_argument('--ignore-certificate-errors')
-        self.__options.page_load_strategy = 'eager'
-
-        self.__browser = Chrome(options=self.__options)
-        self.__pageLimit = page_limit
-        self.__sleep_timeout = sleep_timeout
-        self.__pageCount = 0
-        self.__loadTimeout = 30
-        self.__browser.set_page_load_timeout(self.__loadTimeout)
-
-    def read_page_source(self, url):
-        if self.__pageCount == self.__pageLimit:
-            self.clear()
-            self.__browser = Chrome(self.__options)
-            self.__pageCount = 0
-            self.__browser.set_page_load_timeout(self.__loadTimeout)
-
-        try:
-            self.__browser.get(url)
-        except TimeoutException as e:
-            print(f'[Timeout] Page load exceeded limit for {url}: {e}', file=sys.stderr)
-            time.sleep(self.__sleep_timeout)
-            # Stop further resource loading so browser doesn't hang
-            self.__browser.execute_script('window.stop();')
-        except WebDriverException as e:
-            print(f'[WebDriver error] Could not load {url}: {e}', file=sys.stderr)
-            time.sleep(self.__sleep_timeout)
-            # Optionally stop loading here too
-            self.__browser.execute_script('window.stop();')
-        finally:
-            time.sleep(self.__sleep_timeout)
-
-        self.__pageCount += 1
-        html_soup = BeautifulSoup(self.__browser.page_source, features='html.parser')
-        return html_soup
-
-    def clear(self):
-        self.__browser.quit()
-
-    def __del__(self):
-        self.clear()
+import utils.fetch
+import utils.run_stats
+import utils.season_cache
+import utils.season_cube
+import utils.store
+import utils.teams
+from utils.json_utils import dump as json_dump
+from utils.json_utils import load as json_load
 
 
 _offline_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+_scoreboard_selector = 'div.Scoreboard__Row'
+_box_scores_selector = 'div.players-table__sortable'
+_schedule_selector = 'div.table-caption, caption.Table__Caption'
 
 
 def _parse_box_scores_titles(tables):
@@ -230,93 +196,289 @@ def _parse_team_names(scoreboard_html):
     return team_names
 
 
-def _box_scores_offline(league_id, league_name, team_names, sports, matchup):
-    today = datetime.datetime.today().date()
-    season_start_year = today.year if today.month > 6 else today.year - 1
-    season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
-    offline_box_scores_dir = os.path.join(_offline_data_dir, sports, league_id, season_str)
-
-    offline_data_path = os.path.join(offline_box_scores_dir, f'box_scores_{matchup}.pkl')
-    if os.path.isfile(offline_data_path):
-        with open(offline_data_path, 'rb') as fp:
-            box_scores_stats = pickle.load(fp)
-            box_scores_stats_updated = {}
-            for old_team_key, stats in box_scores_stats.items():
-                team_id = old_team_key[1]
-                actual_team_key = (team_names[team_id], team_id, league_name, league_id)
-                box_scores_stats_updated[actual_team_key] = stats
-            return box_scores_stats_updated
-    return None
-
-
-def _box_scores_online(league_id, sports, matchup, pairs, group_schedule, browser):
-    today = datetime.datetime.today().date()
-    season_start_year = today.year if today.month > 6 else today.year - 1
+def _find_scoreboard_data(html_soup):
+    scoreboard_rows = html_soup.findAll('div', {'class': 'Scoreboard__Row'})
+    return html_soup.findAll('h3')[:1] + scoreboard_rows if scoreboard_rows else []
 
-    scoring_period_id = (group_schedule[matchup][0][0] - group_schedule[1][0][0]).days + 1
-    box_scores_stats = {}
-    for pair in pairs:
-        team_pair = (pair[0][0], pair[1][0])
-        url = (f'https://fantasy.espn.com/{sports}/boxscore?leagueId={league_id}&matchupPeriodId={matchup}'
-               f'&scoringPeriodId={scoring_period_id}'
-               f'&seasonId={season_start_year + 1}&teamId={team_pair[0][1]}&view=matchup')
-
-        data_html = []
-        while len(data_html) == 0:
-            html_soup = browser.read_page_source(url)
-            data_html = html_soup.findAll(
-                ['div', 'span'], {'class': ['players-table__sortable', 'team-name truncate']})
-
-        tables_pairs = [[], []]
-        current_team_index = -1
-        for table_or_name in data_html:
-            if table_or_name.name == 'span':
-                current_team_index += 1
-            else:
-                tables_pairs[current_team_index].append(table_or_name)
 
-        for player, tables in zip(team_pair, tables_pairs):
-            box_scores_titles = _parse_box_scores_titles(tables)
-            box_scores_data = _parse_box_scores_data(tables)
-            box_scores_totals = _parse_box_scores_totals(tables)
-            box_scores_stats[player] = (box_scores_titles, box_scores_data, box_scores_totals)
+def _parse_scoreboard_page(league_id, html_soup, is_category_league):
+    league_name = html_soup.findAll('h3')[0].text
+    team_names = _parse_team_names(html_soup)
+    matchup_scores = _parse_matchup_scores(html_soup, league_id, league_name, team_names)
+    matchup_category_pairs = None if not is_category_league \
+        else _parse_matchup_category_pairs(html_soup, league_id, league_name, team_names)
+    return matchup_scores, team_names, matchup_category_pairs, league_name
 
-    season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
-    offline_box_scores_dir = os.path.join(_offline_data_dir, sports, league_id, season_str)
-    os.makedirs(offline_box_scores_dir, exist_ok=True)
-    offline_data_path = os.path.join(offline_box_scores_dir, f'box_scores_{matchup}.pkl')
-    with open(offline_data_path, 'wb') as fp:
-        pickle.dump(box_scores_stats, fp)
+
+def _find_box_scores_data(html_soup):
+    return html_soup.findAll(['div', 'span'], {'class': ['players-table__sortable', 'team-name truncate']})
+
+
+def _parse_box_scores_page(team_pair, html_soup):
+    tables_pairs = [[], []]
+    current_team_index = -1
+    for table_or_name in _find_box_scores_data(html_soup):
+        if table_or_name.name == 'span':
+            current_team_index += 1
+        else:
+            tables_pairs[current_team_index].append(table_or_name)
+
+    box_scores_stats = {}
+    for player, tables in zip(team_pair, tables_pairs):
+        box_scores_titles = _parse_box_scores_titles(tables)
+        box_scores_data = _parse_box_scores_data(tables)
+        box_scores_totals = _parse_box_scores_totals(tables)
+        box_scores_stats[player] = (box_scores_titles, box_scores_data, box_scores_totals)
     return box_scores_stats
 
 
-def group_box_scores(group_settings, group_schedule, matchup, browser, scoreboards, online_page_matchups):
+def _find_schedule_data(html_soup):
+    div_captions = html_soup.findAll('div', {'class': 'table-caption'})
+    caption_captions = html_soup.findAll('caption', {'class': 'Table__Caption'})
+    return div_captions + caption_captions
+
+
+def _parse_schedule_page(html_soup, is_playoffs_support):
+    league_schedule = {}
+    number = 0
+    for matchup_html in _find_schedule_data(html_soup):
+        number, dates, is_playoffs = _get_matchup_schedule(matchup_html.text, number)
+        if not is_playoffs or is_playoffs_support:
+            league_schedule[number] = (dates, is_playoffs)
+    return league_schedule
+
+
+class PageSource(object):
+    def __init__(self, browser, fetch_settings, is_archive_enabled, job=None):
+        self.__browser = browser
+        self.__fetch_settings = fetch_settings
+        self.__is_archive_enabled = is_archive_enabled
+        self.__job = job
+
+    def __fetch(self, sports, tasks, ready_selector, find_data, parse, known_hashes, archive_record=None):
+        urls = {key: url for key, _, url in tasks}
+        records = []
+        if not self.__is_archive_enabled:
+            archive_record = None
+
+        def parse_page(key, page_source):
+            html_soup = BeautifulSoup(page_source, features='html.parser')
+            page_data = find_data(html_soup)
+            if not page_data:
+                return None
+            page_hash = utils.fetch.content_hash(page_data)
+            if known_hashes.get(key) == page_hash:
+                return page_hash, None
+            # An unchanged page is already archived under an earlier fetch, so only changed pages are appended
+            if archive_record is not None:
+                records.append(archive_record(key, urls[key], page_data))
+            return page_hash, parse(key, html_soup)
+
+        result = {}
+        submit = lambda key, url: self.__browser.submit(url, ready_selector, self.__job)
+        try:
+            utils.fetch.fetch_pages(tasks, submit, parse_page, result.__setitem__, self.__fetch_settings)
+        finally:
+            if records:
+                utils.archive.append(sports, records)
+        return result
+
+    def scoreboards(self, sports, page_requests, is_category_league, known_hashes):
+        espn_scoreboard_url = f'https://fantasy.espn.com/{sports}/league/scoreboard'
+        tasks = [
+            ((league_id, m), league_id, f'{espn_scoreboard_url}?leagueId={league_id}&matchupPeriodId={m}')
+            for league_id, m in page_requests
+        ]
+        parse = lambda key, html_soup: _parse_scoreboard_page(key[0], html_soup, is_category_league)
+        archive_record = lambda key, url, page_data: utils.archive.page_record(
+            url, 'scoreboard', key[0], key[1], page_data, is_category_league=is_category_league)
+        return self.__fetch(
+            sports, tasks, _scoreboard_selector, _find_scoreboard_data, parse, known_hashes, archive_record)
+
+    def box_scores(self, sports, page_requests, known_hashes):
+        tasks = []
+        team_pairs = {}
+        known_pair_hashes = {}
+        for league_id, matchup, pairs, scoring_period_id, season_id in page_requests:
+            matchup_hashes = known_hashes.get((league_id, matchup), '').split(',')
+            for index, pair in enumerate(pairs):
+                if index < len(matchup_hashes):
+                    known_pair_hashes[(league_id, matchup, index)] = matchup_hashes[index]
+                url = (f'https://fantasy.espn.com/{sports}/boxscore?leagueId={league_id}&matchupPeriodId={matchup}'
+                       f'&scoringPeriodId={scoring_period_id}'
+                       f'&seasonId={season_id}&teamId={pair[0][0][1]}&view=matchup')
+                tasks.append(((league_id, matchup, index), league_id, url))
+                team_pairs[(league_id, matchup, index)] = (pair[0][0], pair[1][0])
+
+        parse = lambda key, html_soup: _parse_box_scores_page(team_pairs[key], html_soup)
+        archive_record = lambda key, url, page_data: utils.archive.page_record(
+            url, 'box_scores', key[0], key[1], page_data, index=key[2], team_pair=team_pairs[key])
+        pages = self.__fetch(
+            sports, tasks, _box_scores_selector, _find_box_scores_data, parse, known_pair_hashes, archive_record)
+
+        pair_hashes = defaultdict(list)
+        box_scores = defaultdict(dict)
+        for (league_id, matchup, _), (page_hash, pair_box_scores) in sorted(pages.items(), key=itemgetter(0)):
+            pair_hashes[(league_id, matchup)].append(page_hash)
+            box_scores[(league_id, matchup)].update(pair_box_scores or {})
+        return {key: (','.join(pair_hashes[key]), box_scores[key] or None) for key in pair_hashes}
+
+    def schedules(self, sports, league_ids, is_playoffs_support):
+        tasks = [
+            (league_id, league_id, f'https://fantasy.espn.com/{sports}/league/schedule?leagueId={league_id}')
+            for league_id in league_ids
+        ]
+        parse = lambda key, html_soup: _parse_schedule_page(html_soup, is_playoffs_support)
+        pages = self.__fetch(sports, tasks, _schedule_selector, _find_schedule_data, parse, {})
+        return {league_id: league_schedule for league_id, (_, league_schedule) in pages.items()}
+
+
+def _box_scores_offline(saved_box_scores, team_keys):
+    if saved_box_scores is None:
+        return None
+
+    return {team_keys[team_id]: stats for team_id, stats in saved_box_scores.items()}
+
+
+def _box_scores_request(league_id, matchup, pairs, group_schedule):
+    today = datetime.datetime.today().date()
+    season_start_year = today.year if today.month > 6 else today.year - 1
+    scoring_period_id = (group_schedule[matchup][0][0] - group_schedule[1][0][0]).days + 1
+    return league_id, matchup, pairs, scoring_period_id, season_start_year + 1
+
+
+class LeagueBoxScores(Mapping):
+    def __init__(self, league_id, sports, matchup, team_keys, max_loaded_matchups):
+        self.__league_id = league_id
+        self.__sports = sports
+        self.__matchup = matchup
+        self.__team_keys = team_keys
+        self.__max_loaded_matchups = max_loaded_matchups
+        self.__store = None
+        self.__totals = None
+        self.__loaded = OrderedDict()
+        self.__loads = Counter()
+        self.__folds = {}
+
+    def __season_store(self):
+        # One connection serves every read of the league instead of reopening the store per matchup
+        if self.__store is None:
+            self.__store = utils.store.SeasonStore(self.__league_id, _scoreboard_dir(self.__league_id, self.__sports))
+        return self.__store
+
+    def __getitem__(self, matchup):
+        if not 1 <= matchup <= self.__matchup:
+            raise KeyError(matchup)
+        if matchup in self.__loaded:
+            self.__loaded.move_to_end(matchup)
+            return self.__loaded[matchup]
+
+        saved_box_scores = self.__season_store().box_scores(matchup).get(matchup, {})
+        matchup_box_scores = _box_scores_offline(saved_box_scores, self.__team_keys)
+        self.__loads[matchup] += 1
+        utils.run_stats.add('box scores', 'loaded matchups')
+        if self.__loads[matchup] > 1:
+            utils.run_stats.add('box scores', 'reloaded matchups')
+        utils.run_stats.maximum('box scores', 'max loads per matchup', self.__loads[matchup])
+        utils.run_stats.add('box scores', 'loaded mb', utils.season_cache.approximate_size(saved_box_scores) / 2 ** 20)
+        self.set_matchup(matchup, matchup_box_scores)
+        return matchup_box_scores
+
+    def __iter__(self):
+        return iter(range(1, self.__matchup + 1))
+
+    def __len__(self):
+        return self.__matchup
+
+    def set_matchup(self, matchup, matchup_box_scores):
+        if self.__totals is not None:
+            self.__totals[matchup] = {team: totals for team, (_, _, totals) in matchup_box_scores.items()}
+        self.__loaded[matchup] = matchup_box_scores
+        self.__loaded.move_to_end(matchup)
+        # Evicted matchups are saved already, so they are read from the store again when needed
+        while self.__max_loaded_matchups and len(self.__loaded) > self.__max_loaded_matchups:
+            self.__loaded.popitem(last=False)
+            utils.run_stats.add('box scores', 'evicted matchups')
+
+    def totals(self, matchup):
+        # Team totals are small, so they stay loaded for the whole season and need no player lines
+        if self.__totals is None:
+            saved_totals = self.__season_store().box_score_totals()
+            self.__totals = {
+                m: {self.__team_keys[team_id]: totals for team_id, totals in saved_totals.get(m, {}).items()}
+                for m in self
+            }
+        return self.__totals[matchup]
+
+    def fold(self, name, matchup, initial, update):
+        # Only the furthest state is kept and later matchups are folded into it in place, so nothing season-sized
+        # is copied. Callers read the returned state and copy whatever they change.
+        folded_matchup, state = self.__folds.get(name, (0, None))
+        if matchup < folded_matchup:
+            utils.run_stats.add('box scores', 'restarted folds')
+            folded_matchup, state = 0, None
+        if state is None:
+            state = initial()
+        for m in range(folded_matchup + 1, matchup + 1):
+            update(state, self[m])
+        self.__folds[name] = (matchup, state)
+        return state
+
+    def close(self):
+        if self.__store is not None:
+            self.__store.close()
+            self.__store = None
+
+
+def close_box_scores(box_scores):
+    for league_box_scores in (box_scores or {}).values():
+        league_box_scores.close()
+
+
+def group_box_scores(group_settings, group_schedule, matchup, source, scoreboards, online_page_matchups,
+                     page_hashes, max_loaded_matchups):
     if not group_settings['is_full_support']:
         return None
 
     sports = group_settings['sports']
-    box_scores = defaultdict(dict)
+    box_scores = {}
+    page_requests = []
+    known_hashes = {}
     for league in group_settings['leagues']:
         pairs, team_names, _, league_name = scoreboards[league]
+        team_keys = utils.teams.register_keys(league, league_name, team_names)
+        box_scores[league] = LeagueBoxScores(league, sports, matchup, team_keys, max_loaded_matchups)
+        saved_matchups = offline_manifest(league, sports)['box_scores']
         for current_matchup in range(1, matchup + 1):
-            is_offline = current_matchup not in online_page_matchups
-            matchup_box_scores = None
-            if is_offline:
-                matchup_box_scores = _box_scores_offline(
-                    league, league_name, team_names, sports, current_matchup)
-            if matchup_box_scores is None:
-                matchup_box_scores = _box_scores_online(
-                    league, sports, current_matchup, pairs[current_matchup], group_schedule, browser)
-            box_scores[league][current_matchup] = matchup_box_scores
+            if not is_fetch_needed(current_matchup, online_page_matchups, saved_matchups):
+                continue
+            known_hash = page_hashes.known(league, f'box_scores_{current_matchup}')
+            if current_matchup in saved_matchups and known_hash is not None:
+                known_hashes[(league, current_matchup)] = known_hash
+            page_requests.append(_box_scores_request(league, current_matchup, pairs[current_matchup], group_schedule))
+
+    online_box_scores = source.box_scores(sports, page_requests, known_hashes)
+    box_scores_to_save = defaultdict(dict)
+    for (league, current_matchup), (page_hash, matchup_box_scores) in online_box_scores.items():
+        page_hashes.update(league, f'box_scores_{current_matchup}', page_hash)
+        if matchup_box_scores is None:
+            continue
 
+        # Sources may return only the changed pairs of a matchup, so they are merged over the stored ones
+        saved_box_scores = box_scores[league][current_matchup] if (league, current_matchup) in known_hashes else {}
+        box_scores_to_save[league][current_matchup] = {**saved_box_scores, **matchup_box_scores}
+    for league, league_box_scores in box_scores_to_save.items():
+        _save_season_data(league, sports, 'box_scores', league_box_scores)
+        for current_matchup, matchup_box_scores in league_box_scores.items():
+            box_scores[league].set_matchup(current_matchup, matchup_box_scores)
     return box_scores
 
 
-def goalkeeper_games(matchup_box_scores):
-    if not matchup_box_scores:
+def goalkeeper_games(matchup_totals):
+    if not matchup_totals:
         return None
     gk_games = {}
-    for team, (_, _, box_scores_totals) in matchup_box_scores.items():
+    for team, box_scores_totals in matchup_totals.items():
         gk_games[team] = int(box_scores_totals['GS']) if 'GS' in box_scores_totals else 0
     return gk_games if np.sum(list(gk_games.values())) != 0 else None
 
@@ -351,66 +513,50 @@ def _parse_matchup_category_pairs(scoreboard_html, league_id, league_name, team_
     return pairs, categories
 
 
-def minutes(matchup_box_scores):
-    if not matchup_box_scores:
+def minutes(matchup_totals):
+    if not matchup_totals:
         return None
     minutes = {}
-    for team, (_, _, box_scores_totals) in matchup_box_scores.items():
+    for team, box_scores_totals in matchup_totals.items():
         minutes[team] = int(box_scores_totals['MIN']) if 'MIN' in box_scores_totals else 0
     return minutes if np.sum(list(minutes.values())) != 0 else None
 
 
-def player_games(matchup_box_scores):
-    if not matchup_box_scores:
+def player_games(matchup_totals):
+    if not matchup_totals:
         return None
     player_games = {}
-    for team, (_, _, box_scores_totals) in matchup_box_scores.items():
+    for team, box_scores_totals in matchup_totals.items():
         player_games[team] = int(box_scores_totals['GP']) if 'GP' in box_scores_totals else 0
         player_games[team] += int(box_scores_totals['GS']) if 'GS' in box_scores_totals else 0
     return player_games if np.sum(list(player_games.values())) != 0 else None
 
 
-def _schedule(league_id, sports, is_playoffs_support, is_offline, browser):
-    today = datetime.datetime.today().date()
-    season_start_year = today.year if today.month > 6 else today.year - 1
-    season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
-    offline_data_dir = os.path.join(_offline_data_dir, sports, league_id, season_str)
-    os.makedirs(offline_data_dir, exist_ok=True)
-
-    offline_schedule_path = os.path.join(offline_data_dir, 'schedule.pkl')
-    if os.path.isfile(offline_schedule_path) and is_offline:
-        with open(offline_schedule_path, 'rb') as fp:
-            league_schedule = pickle.load(fp)
-            return league_schedule
-
-    schedule_url = f'https://fantasy.espn.com/{sports}/league/schedule?leagueId={league_id}'
+def offline_schedules(group_settings, use_offline_schedule, read_only=False):
+    schedules = {}
+    for league in group_settings['leagues']:
+        sports = group_settings['sports']
+        offline_schedule = _season_data(league, sports, 'schedule', read_only) if use_offline_schedule else None
+        if offline_schedule:
+            schedules[league] = offline_schedule
+    return schedules
 
-    div_captions = None
-    caption_captions = None
-    while not div_captions and not caption_captions:
-        schedule_html = browser.read_page_source(schedule_url)
-        div_captions = schedule_html.findAll('div', {'class': 'table-caption'})
-        caption_captions = schedule_html.findAll('caption', {'class': 'Table__Caption'})
 
-    league_schedule = {}
-    number = 0
-    for matchups_html_list in [div_captions, caption_captions]:
-        for matchup_html in matchups_html_list:
-            number, dates, is_playoffs = _get_matchup_schedule(matchup_html.text, number)
-            if not is_playoffs or is_playoffs_support:
-                league_schedule[number] = (dates, is_playoffs)
-
-    with open(offline_schedule_path, 'wb') as fp:
-        pickle.dump(league_schedule, fp)
-    return league_schedule
+def group_schedule(group_settings, source, use_offline_schedule):
+    sports = group_settings['sports']
+    schedules = offline_schedules(group_settings, use_offline_schedule)
+    leagues_to_load = [league for league in group_settings['leagues'] if league not in schedules]
+    loaded_schedules = source.schedules(sports, leagues_to_load, group_settings['is_playoffs_support'])
+    for league, league_schedule in loaded_schedules.items():
+        _save_season_data(league, sports, 'schedule', league_schedule)
+        schedules[league] = league_schedule
+    return common_schedule(group_settings, schedules)
 
 
-def group_schedule(group_settings, browser, use_offline_schedule):
+def common_schedule(group_settings, schedules):
     schedule = None
-    sports = group_settings['sports']
     for league in group_settings['leagues']:
-        current_schedule = _schedule(
-            league, sports, group_settings['is_playoffs_support'], use_offline_schedule, browser)
+        current_schedule = schedules[league]
         if schedule is None:
             schedule = current_schedule
         elif schedule != current_schedule:
@@ -420,21 +566,19 @@ def group_schedule(group_settings, browser, use_offline_schedule):
     return schedule
 
 
-def _update_matchup_scores(matchup_scores, league_id, league_name, team_names):
+def _update_matchup_scores(matchup_scores, team_keys):
     matchup_scores_actual = []
     for pair in matchup_scores:
         pair_actualized = []
         for old_team_key, team_stats in pair:
-            team_id = old_team_key[1]
-            actual_team_key = (team_names[team_id], team_id, league_name, league_id)
-            pair_actualized.append((actual_team_key, team_stats))
+            pair_actualized.append((team_keys[old_team_key[1]], team_stats))
 
         matchup_scores_actual.append(pair_actualized)
 
     return matchup_scores_actual
 
 
-def _update_matchup_category_pairs(matchup_category_pairs, league_id, league_name, team_names):
+def _update_matchup_category_pairs(matchup_category_pairs, team_keys):
     if matchup_category_pairs is None:
         return matchup_category_pairs
 
@@ -444,62 +588,275 @@ def _update_matchup_category_pairs(matchup_category_pairs, league_id, league_nam
     for pair in stats_pairs:
         pair_actualized = []
         for old_team_key, team_stats in pair:
-            team_id = old_team_key[1]
-            actual_team_key = (team_names[team_id], team_id, league_name, league_id)
-            pair_actualized.append((actual_team_key, team_stats))
+            pair_actualized.append((team_keys[old_team_key[1]], team_stats))
 
         stats_pairs_actual.append(pair_actualized)
     return stats_pairs_actual, categories
 
 
-def load_scoreboards(league_id, sports, matchup, browser, online_matchups, is_category_league):
+def _season_dir(league_id, sports):
     today = datetime.datetime.today().date()
     season_start_year = today.year if today.month > 6 else today.year - 1
     season_str = f'{season_start_year}-{str(season_start_year + 1)[-2:]}'
-    offline_scoreboard_dir = os.path.join(_offline_data_dir, sports, league_id, season_str)
+    return os.path.join(_offline_data_dir, sports, league_id, season_str)
+
+
+def _scoreboard_dir(league_id, sports):
+    offline_scoreboard_dir = _season_dir(league_id, sports)
     os.makedirs(offline_scoreboard_dir, exist_ok=True)
+    return offline_scoreboard_dir
+
+
+def _season_data(league_id, sports, kind, read_only=False):
+    season_dir = _season_dir(league_id, sports) if read_only else _scoreboard_dir(league_id, sports)
+    if read_only and not utils.store.is_saved(season_dir):
+        return None
+
+    def load():
+        with utils.store.SeasonStore(league_id, season_dir, read_only) as store:
+            return getattr(store, kind)()
+
+    return utils.season_cache.get((season_dir, kind), load)
+
+
+def _save_season_data(league_id, sports, kind, data):
+    season_dir = _scoreboard_dir(league_id, sports)
+    with utils.store.SeasonStore(league_id, season_dir) as store:
+        getattr(store, f'save_{kind}')(data)
+    utils.season_cache.invalidate((season_dir, kind))
+
+
+def offline_manifest(league_id, sports, read_only=False):
+    season_dir = _season_dir(league_id, sports) if read_only else _scoreboard_dir(league_id, sports)
+    if read_only and not utils.store.is_saved(season_dir):
+        return {'schedule': set(), 'scoreboards': set(), 'box_scores': set()}
+
+    with utils.store.SeasonStore(league_id, season_dir, read_only) as store:
+        return store.manifest()
+
+
+def is_fetch_needed(matchup, online_matchups, saved_matchups):
+    return matchup in online_matchups or matchup not in saved_matchups
+
+
+def group_aggregate_keys(group_settings, schedule, scoreboards, page_hashes):
+    # Stored aggregates are keyed on the pages each matchup is parsed from, so no parsed data is hashed again
+    page_names = ['matchup_{}']
+    is_activation = group_settings['is_full_support'] and 'gk_threshold' in group_settings
+    if is_activation:
+        page_names.append('box_scores_{}')
+    is_playoffs_double_gk_games = is_activation and group_settings.get('is_playoffs_double_gk_games', False)
+    settings = [group_settings.get('tiebreaker'), group_settings.get('gk_threshold'), is_playoffs_double_gk_games]
+
+    aggregate_keys = {}
+    for league in group_settings['leagues']:
+        scores, team_names, _, league_name = scoreboards[league]
+        # Team keys carry the latest names, which every stored matchup result is keyed with
+        league_key = utils.fetch.content_hash([repr(settings), league_name, repr(sorted(team_names.items()))])
+        matchup_keys = {}
+        for m in scores:
+            page_hashes_list = [page_hashes.current(league, page_name.format(m)) for page_name in page_names]
+            if None in page_hashes_list:
+                matchup_keys[m] = None
+                continue
+            is_double_gk_games = is_playoffs_double_gk_games and schedule[m][-1]
+            matchup_keys[m] = utils.fetch.content_hash(page_hashes_list + [str(is_double_gk_games)])
+        aggregate_keys[league] = (league_key, matchup_keys)
+    return aggregate_keys
+
+
+def season_aggregates(league_id, sports, kind, aggregate_keys):
+    league_key, matchup_keys = aggregate_keys[league_id]
+    return utils.aggregates.MatchupAggregates(
+        league_id, _scoreboard_dir(league_id, sports), kind, league_key, matchup_keys)
+
+
+def _season_cube(season_dir):
+    return utils.season_cache.get((season_dir, 'cube'), lambda: utils.season_cube.load(season_dir))
+
+
+def _save_season_cube(season_dir, season_scoreboards):
+    utils.season_cube.save(season_dir, utils.season_cube.build(season_scoreboards))
+    utils.season_cache.invalidate((season_dir, 'cube'))
+
+
+def _league_scoreboards(league_id, sports, matchup, loaded_scoreboards):
+    league_scoreboards = {m: data for (league, m), data in loaded_scoreboards.items() if league == league_id}
+    if league_scoreboards:
+        _save_season_data(league_id, sports, 'scoreboards', league_scoreboards)
+    season_scoreboards = _season_data(league_id, sports, 'scoreboards')
+    season_dir = _scoreboard_dir(league_id, sports)
+    if league_scoreboards or _season_cube(season_dir) is None:
+        _save_season_cube(season_dir, season_scoreboards)
 
-    espn_scoreboard_url = f'https://fantasy.espn.com/{sports}/league/scoreboard'
     league_name = None
     team_names = None
+    team_keys = None
     scores = {}
     category_pairs = {}
     for m in range(matchup, 0, -1):
-        matchup_pkl_path = os.path.join(offline_scoreboard_dir, f'matchup_{m}.pkl')
-        if m not in online_matchups and os.path.exists(matchup_pkl_path):
-            with open(matchup_pkl_path, 'rb') as fp:
-                matchup_scores, matchup_team_names, matchup_category_pairs, matchup_league_name = pickle.load(fp)
-
-            actual_league_name = matchup_league_name if league_name is None else league_name
-            actual_team_names = matchup_team_names if team_names is None else team_names
-            matchup_scores = _update_matchup_scores(matchup_scores, league_id, actual_league_name, actual_team_names)
-            matchup_category_pairs = _update_matchup_category_pairs(
-                matchup_category_pairs, league_id, actual_league_name, actual_team_names)
+        matchup_scores, matchup_team_names, matchup_category_pairs, matchup_league_name = season_scoreboards[m]
+
+        # Names of the latest matchup are shown for the whole season
+        if team_keys is None:
+            league_name = matchup_league_name
+            team_names = matchup_team_names
+            team_keys = utils.teams.register_keys(league_id, league_name, team_names)
+        scores[m] = _update_matchup_scores(matchup_scores, team_keys)
+        category_pairs[m] = _update_matchup_category_pairs(matchup_category_pairs, team_keys)
+
+    return scores, team_names, category_pairs, league_name
+
+
+def group_scoreboards(group_settings, matchup, source, online_matchups, is_category_league, page_hashes):
+    sports = group_settings['sports']
+    page_requests = []
+    known_hashes = {}
+    for league_id in group_settings['leagues']:
+        saved_matchups = offline_manifest(league_id, sports)['scoreboards']
+        for m in range(matchup, 0, -1):
+            if is_fetch_needed(m, online_matchups, saved_matchups):
+                page_requests.append((league_id, m))
+                known_hash = page_hashes.known(league_id, f'matchup_{m}')
+                if m in saved_matchups and known_hash is not None:
+                    known_hashes[(league_id, m)] = known_hash
+
+    loaded_scoreboards = {}
+    pages = source.scoreboards(sports, page_requests, is_category_league, known_hashes)
+    for (league_id, m), (page_hash, matchup_data) in pages.items():
+        page_hashes.update(league_id, f'matchup_{m}', page_hash)
+        if matchup_data is not None:
+            loaded_scoreboards[(league_id, m)] = matchup_data
+    return {
+        league_id: _league_scoreboards(league_id, sports, matchup, loaded_scoreboards)
+        for league_id in group_settings['leagues']
+    }
+
+
+def _page_hashes_path(league_id, sports):
+    return os.path.join(_scoreboard_dir(league_id, sports), 'page_hashes.json')
+
+
+class PageHashes(object):
+    def __init__(self, sports):
+        self.__sports = sports
+        self.__saved = {}
+        self.__updated = defaultdict(dict)
+        self.__changed = 0
+        self.__unchanged = 0
+
+    def __league_hashes(self, league_id):
+        if league_id not in self.__saved:
+            self.__saved[league_id] = json_load(_page_hashes_path(league_id, self.__sports), {})
+        return self.__saved[league_id]
+
+    def known(self, league_id, page_name):
+        return self.__league_hashes(league_id).get(page_name)
+
+    def current(self, league_id, page_name):
+        updated_hashes = self.__updated.get(league_id, {})
+        if page_name in updated_hashes:
+            return updated_hashes[page_name]
+        return self.known(league_id, page_name)
+
+    def update(self, league_id, page_name, page_hash):
+        if self.known(league_id, page_name) == page_hash:
+            self.__unchanged += 1
+            utils.run_stats.add('change detection', 'unchanged pages')
         else:
-            html_soup = None
-            while html_soup is None or html_soup.find('div', {'class': 'Scoreboard__Row'}) is None:
-                scoreboard_url = f'{espn_scoreboard_url}?leagueId={league_id}&matchupPeriodId={m}'
-                html_soup = browser.read_page_source(scoreboard_url)
+            self.__changed += 1
+            utils.run_stats.add('change detection', 'changed pages')
+        self.__updated[league_id][page_name] = page_hash
 
-            matchup_league_name = html_soup.findAll('h3')[0].text
-            matchup_team_names = _parse_team_names(html_soup)
+    def is_unchanged(self):
+        return self.__unchanged > 0 and self.__changed == 0
 
-            actual_league_name = matchup_league_name if league_name is None else league_name
-            actual_team_names = matchup_team_names if team_names is None else team_names
-            matchup_scores = _parse_matchup_scores(html_soup, league_id, actual_league_name, actual_team_names)
-            matchup_category_pairs = None if not is_category_league \
-                else _parse_matchup_category_pairs(html_soup, league_id, actual_league_name, actual_team_names)
+    def save(self):
+        for league_id, updated_hashes in self.__updated.items():
+            league_hashes = self.__league_hashes(league_id)
+            league_hashes.update(updated_hashes)
+            json_dump(league_hashes, _page_hashes_path(league_id, self.__sports))
+        self.__updated.clear()
 
-            with open(matchup_pkl_path, 'wb') as fp:
-                matchup_data = (matchup_scores, matchup_team_names, matchup_category_pairs, matchup_league_name)
-                pickle.dump(matchup_data, fp)
 
-        league_name = matchup_league_name if league_name is None else league_name
-        team_names = matchup_team_names if team_names is None else team_names
-        scores[m] = matchup_scores
-        category_pairs[m] = matchup_category_pairs
+def _reparse_season(season_dir):
+    league_id = os.path.basename(os.path.dirname(season_dir))
+    scoreboards = {}
+    box_scores = defaultdict(dict)
+    pages = utils.archive.latest_pages(season_dir)
+    for (page, matchup, _), record in sorted(pages.items(), key=itemgetter(0)):
+        html_soup = BeautifulSoup(record['html'], features='html.parser')
+        if page == 'scoreboard':
+            scoreboards[matchup] = _parse_scoreboard_page(league_id, html_soup, record['is_category_league'])
+        else:
+            team_pair = [tuple(team) for team in record['team_pair']]
+            box_scores[matchup].update(_parse_box_scores_page(team_pair, html_soup))
+
+    with utils.store.SeasonStore(league_id, season_dir) as store:
+        store.save_scoreboards(scoreboards)
+        store.save_box_scores(box_scores)
+        season_scoreboards = store.scoreboards()
+    utils.season_cube.save(season_dir, utils.season_cube.build(season_scoreboards))
+
+    # Stored hashes describe raw pages, not parsed data, so rebuilt leagues have to be reported again
+    page_hashes_path = os.path.join(season_dir, 'page_hashes.json')
+    if os.path.isfile(page_hashes_path):
+        os.remove(page_hashes_path)
+    return len(pages)
+
+
+def reparse_archives(n_processes):
+    season_dirs = utils.archive.season_dirs()
+    with multiprocessing.Pool(n_processes) as pool:
+        pages_count = pool.map(_reparse_season, season_dirs)
+    utils.run_stats.add('reparse', 'seasons', len(season_dirs))
+    utils.run_stats.add('reparse', 'pages', sum(pages_count))
+
+
+def _migrate_season(season_dir):
+    league_id = os.path.basename(os.path.dirname(season_dir))
+    scoreboards = {}
+    box_scores = {}
+    schedule = None
+    for file_name in os.listdir(season_dir):
+        pickle_match = re.fullmatch(r'(matchup|box_scores)_(\d+)\.pkl', file_name)
+        if pickle_match is None and file_name != 'schedule.pkl':
+            continue
+        with open(os.path.join(season_dir, file_name), 'rb') as fp:
+            data = pickle.load(fp)
+        if pickle_match is None:
+            schedule = data
+        elif pickle_match.group(1) == 'matchup':
+            scoreboards[int(pickle_match.group(2))] = data
+        else:
+            box_scores[int(pickle_match.group(2))] = data
 
-    return scores, team_names, category_pairs, league_name
+    with utils.store.SeasonStore(league_id, season_dir) as store:
+        store.save_scoreboards(scoreboards)
+        store.save_box_scores(box_scores)
+        if schedule is not None:
+            store.save_schedule(schedule)
+        season_scoreboards = store.scoreboards()
+    utils.season_cube.save(season_dir, utils.season_cube.build(season_scoreboards))
+    return len(scoreboards) + len(box_scores)
+
+
+def migrate_pickles():
+    pickle_paths = glob.glob(os.path.join(_offline_data_dir, '*', '*', '*', '*.pkl'))
+    season_dirs = sorted({os.path.dirname(path) for path in pickle_paths})
+    for season_dir in season_dirs:
+        utils.run_stats.add('migration', 'matchups', _migrate_season(season_dir))
+        utils.run_stats.add('migration', 'seasons')
+
+
+def group_category_cubes(group_settings, matchup, box_scores, schedule):
+    cubes = {}
+    for league in group_settings['leagues']:
+        cube = _season_cube(_scoreboard_dir(league, group_settings['sports']))
+        league_box_scores = None if box_scores is None else box_scores[league]
+        cubes[league] = utils.categories.apply_activation_cube(
+            cube, matchup, league_box_scores, group_settings, schedule)
+    return cubes
 
 
 def apply_activation_scoreboards(scoreboards, box_scores, group_settings, schedule, is_category_league):
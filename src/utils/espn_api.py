@@ -0,0 +1,293 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import math
+import os
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import utils.fetch
+from utils.json_utils import load as json_load
+
+
+_repo_root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+_espn_stats = json_load(os.path.join(_repo_root_dir, 'res', 'espn_stats.json'))
+_not_summable_box_scores_cols = {'ATOI', 'GAA', 'SV%'}
+_scoring_period_split = 5
+
+
+def _category_name(sports, stat_id):
+    categories = _espn_stats[sports]['categories']
+    if str(stat_id) not in categories:
+        raise Exception(f'Unknown ESPN stat id {stat_id} for {sports}.')
+    return categories[str(stat_id)]
+
+
+def _team_name(team):
+    if 'name' in team:
+        return team['name']
+    return f'{team["location"]} {team["nickname"]}'.strip()
+
+
+def _format_atoi(minutes, is_padded):
+    total_seconds = int(round(minutes * 60))
+    minutes_str = f'{total_seconds // 60:02d}' if is_padded else str(total_seconds // 60)
+    return f'{minutes_str}:{total_seconds % 60:02d}'
+
+
+def _format_box_score_value(short_col, value):
+    if short_col == 'ATOI':
+        return _format_atoi(value, False)
+    if short_col == 'GAA':
+        return f'{value:.2f}'
+    if short_col == 'SV%':
+        return f'{value:.3f}'.lstrip('0')
+    return f'{value:g}'
+
+
+def _matchup_sides(schedule_item):
+    if 'away' not in schedule_item or 'home' not in schedule_item:
+        return []
+    return [schedule_item['away'], schedule_item['home']]
+
+
+def _category_score(side):
+    cumulative_score = side['cumulativeScore']
+    return f'{cumulative_score["wins"]}-{cumulative_score["losses"]}-{cumulative_score["ties"]}'
+
+
+def _category_stats(side, stat_ids, categories):
+    score_by_stat = side['cumulativeScore']['scoreByStat']
+    stats = []
+    for stat_id, cat in zip(stat_ids, categories):
+        stat = score_by_stat[str(stat_id)]['score']
+        stats.append((cat, _format_atoi(stat, True) if cat == 'ATOI' else float(stat)))
+    return stats
+
+
+def _player_stats(player, scoring_periods, averages):
+    stats = defaultdict(float)
+    average_parts = defaultdict(lambda: [0.0, 0.0])
+    fantasy_points = 0.0
+    for stat_item in player.get('stats', []):
+        # Season and last-n-days splits repeat the same games, so only actual stats per scoring period are summed
+        is_matchup_period = stat_item.get('scoringPeriodId') in scoring_periods
+        if stat_item.get('statSourceId') != 0 or stat_item.get('statSplitTypeId') != _scoring_period_split \
+                or not is_matchup_period:
+            continue
+        item_stats = stat_item.get('stats', {})
+        for stat_id, value in item_stats.items():
+            if stat_id not in averages:
+                stats[stat_id] += value
+        for stat_id, average in averages.items():
+            parts = average_parts[stat_id]
+            parts[0] += math.prod(item_stats.get(part_id, 0.0) for part_id in average['numerator'])
+            parts[1] += sum(item_stats.get(part_id, 0.0) for part_id in average['denominator'])
+        fantasy_points += stat_item.get('appliedTotal', 0.0)
+
+    for stat_id, (numerator, denominator) in average_parts.items():
+        if denominator:
+            stats[stat_id] = averages[stat_id]['scale'] * numerator / denominator
+    return stats, fantasy_points
+
+
+def _team_box_scores(side, sports, is_points_league, scoring_periods):
+    sports_stats = _espn_stats[sports]
+    averages = sports_stats.get('averages', {})
+    groups = sports_stats['box_scores']
+    titles = []
+    for group in groups:
+        columns_ordered = [long_col for _, _, long_col in group['columns']]
+        columns_to_short = {long_col: short_col for _, short_col, long_col in group['columns']}
+        titles.append((columns_ordered, columns_to_short))
+
+    data = [{} for _ in groups]
+    totals = [defaultdict(float) for _ in groups]
+    for entry in side.get('rosterForMatchupPeriod', {}).get('entries', []):
+        if entry['lineupSlotId'] in sports_stats['bench_slots']:
+            continue
+        player = entry['playerPoolEntry']['player']
+        for index, group in enumerate(groups):
+            if group['positions'] is not None and player['defaultPositionId'] not in group['positions']:
+                continue
+            stats, fantasy_points = _player_stats(player, scoring_periods, averages)
+            player_data = {}
+            for stat_id, short_col, long_col in group['columns']:
+                value = stats.get(stat_id, 0.0)
+                player_data[long_col] = _format_box_score_value(short_col, value)
+                if short_col not in _not_summable_box_scores_cols:
+                    totals[index][short_col] += value
+            if is_points_league:
+                player_data['FPTS'] = f'{fantasy_points:g}'
+            data[index][player['fullName']] = player_data
+            break
+
+    totals_merged = {}
+    for group_totals in totals:
+        totals_merged.update({col: f'{value:g}' for col, value in group_totals.items()})
+    return titles, data, totals_merged
+
+
+def _season_id():
+    today = datetime.datetime.today().date()
+    season_start_year = today.year if today.month > 6 else today.year - 1
+    return season_start_year + 1
+
+
+def _parse_scoreboards(league_id, sports, league, matchups, is_category_league):
+    league_name = league['settings']['name']
+    team_names = {str(team['id']): _team_name(team) for team in league['teams']}
+    stat_ids = [item['statId'] for item in league['settings']['scoringSettings']['scoringItems']]
+    categories = [_category_name(sports, stat_id) for stat_id in stat_ids]
+
+    scores = defaultdict(list)
+    stats_pairs = defaultdict(list)
+    for schedule_item in league['schedule']:
+        m = schedule_item['matchupPeriodId']
+        sides = _matchup_sides(schedule_item)
+        if m not in matchups or not sides:
+            continue
+
+        teams = []
+        for side in sides:
+            team_id = str(side['teamId'])
+            teams.append((team_names[team_id], team_id, league_name, league_id))
+        if is_category_league:
+            scores[m].append([(team, _category_score(side)) for team, side in zip(teams, sides)])
+            stats_pairs[m].append(
+                [(team, _category_stats(side, stat_ids, categories)) for team, side in zip(teams, sides)])
+        else:
+            scores[m].append([(team, float(side['totalPoints'])) for team, side in zip(teams, sides)])
+
+    scoreboards = {}
+    for m in matchups:
+        category_pairs = (stats_pairs[m], categories) if is_category_league else None
+        scoreboards[(league_id, m)] = (scores[m], team_names, category_pairs, league_name)
+    return scoreboards
+
+
+def _parse_box_scores(sports, league, matchup, pairs):
+    is_points_league = league['settings']['scoringSettings']['scoringType'] == 'H2H_POINTS'
+    scoring_periods = set(league['settings']['scheduleSettings']['matchupPeriods'][str(matchup)])
+    team_keys = {team[1]: team for pair in pairs for team, _ in pair}
+    box_scores_stats = {}
+    for schedule_item in league['schedule']:
+        if schedule_item['matchupPeriodId'] != matchup:
+            continue
+        for side in _matchup_sides(schedule_item):
+            team_id = str(side['teamId'])
+            if team_id in team_keys:
+                box_scores_stats[team_keys[team_id]] = _team_box_scores(
+                    side, sports, is_points_league, scoring_periods)
+    return box_scores_stats
+
+
+def _season_start(season):
+    return datetime.datetime.fromtimestamp(season['startDate'] / 1000, datetime.timezone.utc).date()
+
+
+def _parse_schedule(league, is_playoffs_support, season_start):
+    schedule_settings = league['settings']['scheduleSettings']
+    regular_season_count = schedule_settings['matchupPeriodCount']
+
+    # The current scoring period stays at 1 before the season and at the last one after it, so dates come from
+    # the season start rather than from today
+    scoring_period_date = lambda period: season_start + datetime.timedelta(days=period - 1)
+
+    league_schedule = {}
+    for number_str, scoring_periods in schedule_settings['matchupPeriods'].items():
+        number = int(number_str)
+        is_playoffs = number > regular_season_count
+        dates = (scoring_period_date(min(scoring_periods)), scoring_period_date(max(scoring_periods)))
+        if not is_playoffs or is_playoffs_support:
+            league_schedule[number] = (dates, is_playoffs)
+    return league_schedule
+
+
+def _with_content_hashes(parsed, known_hashes):
+    result = {}
+    for key, value in parsed.items():
+        value_hash = utils.fetch.content_hash([repr(value)])
+        result[key] = (value_hash, None if known_hashes.get(key) == value_hash else value)
+    return result
+
+
+class ApiSource(object):
+    def __init__(self, api_settings, fetch_settings):
+        self.__url = api_settings['url']
+        self.__fetch_settings = fetch_settings
+        self.__executor = ThreadPoolExecutor(fetch_settings['max_concurrency'])
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=fetch_settings['max_concurrency'])
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+        self.__session.cookies.update(api_settings.get('cookies', {}))
+
+    def __season_url(self, sports, season_id):
+        return f'{self.__url}/{_espn_stats[sports]["game"]}/seasons/{season_id}'
+
+    def __league_url(self, league_id, sports, season_id, views, params=None):
+        query = [('view', view) for view in views] + list((params or {}).items())
+        return f'{self.__season_url(sports, season_id)}/segments/0/leagues/{league_id}?{urlencode(query)}'
+
+    def __read_json(self, url, headers):
+        response = self.__session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def __fetch(self, tasks, parse, headers_getter=None):
+        result = {}
+        submit = lambda key, url: self.__executor.submit(
+            self.__read_json, url, {} if headers_getter is None else headers_getter(key))
+        on_result = lambda key, parsed: result.update(parsed)
+        utils.fetch.fetch_pages(tasks, submit, parse, on_result, self.__fetch_settings)
+        return result
+
+    def scoreboards(self, sports, page_requests, is_category_league, known_hashes):
+        league_matchups = defaultdict(list)
+        for league_id, m in page_requests:
+            league_matchups[league_id].append(m)
+
+        views = ['mTeam', 'mMatchupScore', 'mSettings']
+        tasks = [
+            (league_id, league_id, self.__league_url(league_id, sports, _season_id(), views))
+            for league_id in league_matchups
+        ]
+        parse = lambda league_id, league: _with_content_hashes(
+            _parse_scoreboards(league_id, sports, league, league_matchups[league_id], is_category_league),
+            known_hashes)
+        return self.__fetch(tasks, parse)
+
+    def box_scores(self, sports, page_requests, known_hashes):
+        tasks = []
+        league_pairs = {}
+        views = ['mMatchupScore', 'mScoreboard', 'mSettings']
+        for league_id, matchup, pairs, scoring_period_id, season_id in page_requests:
+            params = {'scoringPeriodId': scoring_period_id}
+            url = self.__league_url(league_id, sports, season_id, views, params)
+            tasks.append(((league_id, matchup), league_id, url))
+            league_pairs[(league_id, matchup)] = pairs
+
+        parse = lambda key, league: _with_content_hashes(
+            {key: _parse_box_scores(sports, league, key[1], league_pairs[key])}, known_hashes)
+        headers_getter = lambda key: {
+            'x-fantasy-filter': json.dumps({'schedule': {'filterMatchupPeriodIds': {'value': [key[1]]}}})
+        }
+        return self.__fetch(tasks, parse, headers_getter)
+
+    def schedules(self, sports, league_ids, is_playoffs_support):
+        if not league_ids:
+            return {}
+
+        season_id = _season_id()
+        season_task = (season_id, sports, self.__season_url(sports, season_id))
+        season_start = self.__fetch([season_task], lambda key, season: {key: _season_start(season)})[season_id]
+        tasks = [
+            (league_id, league_id, self.__league_url(league_id, sports, season_id, ['mSettings']))
+            for league_id in league_ids
+        ]
+        parse = lambda league_id, league: {league_id: _parse_schedule(league, is_playoffs_support, season_start)}
+        return self.__fetch(tasks, parse)
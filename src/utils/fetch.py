@@ -0,0 +1,85 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import sys
+import time
+from urllib.parse import urlparse
+
+import utils.run_stats
+import utils.throttle
+
+
+def content_hash(parts):
+    page_hash = hashlib.sha256()
+    for part in parts:
+        page_hash.update(str(part).encode('utf-8'))
+    return page_hash.hexdigest()
+
+
+def _timed_parse(parse, key, page):
+    parse_start = time.monotonic()
+    result = parse(key, page)
+    utils.run_stats.add('pipeline', 'parsed pages')
+    utils.run_stats.add('pipeline', 'parse seconds', round(time.monotonic() - parse_start, 3))
+    return result
+
+
+async def _fetch_page(task, submit, parse, stages, retry_policy, breaker):
+    key, league_id, url = task
+    semaphore, host_semaphore, parse_slots, parse_executor = stages
+    loop = asyncio.get_running_loop()
+    for attempt in range(retry_policy.max_attempts):
+        if not breaker.allow(league_id):
+            raise Exception(f'Circuit breaker is open for league {league_id}, skipped {url}')
+
+        async with semaphore, host_semaphore:
+            try:
+                page = await asyncio.wrap_future(submit(key, url))
+            except Exception as e:
+                print(f'[Fetch error] Could not read {url}: {e}', file=sys.stderr)
+                page = None
+            if page is not None:
+                # Fetch slot is held until the parse queue has room, so fetching can't run away from parsing
+                await parse_slots.acquire()
+
+        result = None
+        if page is not None:
+            try:
+                result = await loop.run_in_executor(parse_executor, _timed_parse, parse, key, page)
+            finally:
+                parse_slots.release()
+
+        if result is not None:
+            breaker.on_success(league_id)
+            return key, result
+
+        breaker.on_failure(league_id)
+        # Backoff only helps before another attempt, and an open breaker turns the next one down right away
+        if attempt < retry_policy.max_attempts - 1 and not breaker.is_open(league_id):
+            await asyncio.sleep(retry_policy.delay(attempt))
+
+    raise Exception(f'No expected data at {url} after {retry_policy.max_attempts} attempts')
+
+
+async def _fetch_pages(tasks, submit, parse, on_result, fetch_settings):
+    semaphore = asyncio.Semaphore(fetch_settings['max_concurrency'])
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(fetch_settings['per_host_limit']))
+    parse_slots = asyncio.Semaphore(fetch_settings['parse_queue_size'])
+    retry_policy = utils.throttle.RetryPolicy(fetch_settings['retry'])
+    breaker = utils.throttle.circuit_breaker('leagues', fetch_settings['circuit_breaker'])
+    with ThreadPoolExecutor(fetch_settings['parse_workers']) as parse_executor:
+        coroutines = [
+            _fetch_page(task, submit, parse,
+                        (semaphore, host_semaphores[urlparse(task[2]).netloc], parse_slots, parse_executor),
+                        retry_policy, breaker)
+            for task in tasks
+        ]
+        for next_result in asyncio.as_completed(coroutines):
+            key, result = await next_result
+            on_result(key, result)
+
+
+def fetch_pages(tasks, submit, parse, on_result, fetch_settings):
+    if tasks:
+        asyncio.run(_fetch_pages(tasks, submit, parse, on_result, fetch_settings))
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+import utils.common
+import utils.data
+
+
+def _online_matchups(refresh_range, matchup, is_season_ended, is_data_loaded, is_full_support):
+    if not is_full_support:
+        return []
+
+    if is_season_ended:
+        return [matchup]
+
+    return [] if is_data_loaded else refresh_range
+
+
+def matchup_plan(group_settings, schedule, group_loaded_matchups, refresh_matchups):
+    matchup, is_season_ended = utils.common.find_proper_matchup(schedule)
+    if matchup == -1:
+        return None
+
+    is_data_loaded = str(matchup) in group_loaded_matchups
+    is_full_support = group_settings['is_full_support']
+    refresh_range = list(range(max(1, matchup - refresh_matchups), matchup + 1))
+    return {
+        'current': matchup,
+        'online': _online_matchups(refresh_range, matchup, is_season_ended, is_data_loaded, is_full_support),
+        'to_process': refresh_range if is_full_support else [matchup],
+    }
+
+
+def group_plan(group_settings, group_loaded_matchups, global_config):
+    sports = group_settings['sports']
+    # The plan is a dry run: stores are only read, and a league without one has nothing saved yet
+    schedules = utils.data.offline_schedules(group_settings, global_config['use_offline_schedule'], True)
+    plan = {
+        'schedules': [league for league in group_settings['leagues'] if league not in schedules],
+        'scoreboards': [],
+        'box_scores': [],
+        'matchups': None,
+    }
+    # Without every stored schedule the current matchup is only known after the schedule pages are fetched
+    if plan['schedules']:
+        return plan
+
+    schedule = utils.data.common_schedule(group_settings, schedules)
+    plan['matchups'] = None if schedule is None else matchup_plan(
+        group_settings, schedule, group_loaded_matchups, global_config['refresh_matchups'])
+    if plan['matchups'] is None:
+        return plan
+
+    online_matchups = plan['matchups']['online']
+    for league in group_settings['leagues']:
+        manifest = utils.data.offline_manifest(league, sports, True)
+        for m in range(1, plan['matchups']['current'] + 1):
+            if utils.data.is_fetch_needed(m, online_matchups, manifest['scoreboards']):
+                plan['scoreboards'].append((league, m))
+            is_box_scores_needed = utils.data.is_fetch_needed(m, online_matchups, manifest['box_scores'])
+            if group_settings['is_full_support'] and is_box_scores_needed:
+                plan['box_scores'].append((league, m))
+    return plan
+
+
+def _format_matchups(pages):
+    league_ranges = defaultdict(list)
+    for league, m in pages:
+        ranges = league_ranges[league]
+        if ranges and ranges[-1][1] == m - 1:
+            ranges[-1][1] = m
+        else:
+            ranges.append([m, m])
+
+    leagues_str = []
+    for league, ranges in league_ranges.items():
+        ranges_str = ', '.join(str(left) if left == right else f'{left}-{right}' for left, right in ranges)
+        leagues_str.append(f'{league} ({ranges_str})')
+    return '; '.join(leagues_str) or '-'
+
+
+def format_plan(group_settings, plan):
+    leagues = ','.join(group_settings['leagues'])
+    lines = [f'[Plan] {group_settings["sports"]} {leagues}']
+    if plan['schedules']:
+        lines.append(f'    schedule pages: {", ".join(plan["schedules"])} (matchups follow from the fetched schedule)')
+        return '\n'.join(lines)
+    if plan['matchups'] is None:
+        lines.append('    no finished matchup to report')
+        return '\n'.join(lines)
+
+    lines.append(f'    scoreboard pages ({len(plan["scoreboards"])}): {_format_matchups(plan["scoreboards"])}')
+    lines.append(f'    box score matchups ({len(plan["box_scores"])}): {_format_matchups(plan["box_scores"])}')
+    lines.append(f'    reports to rebuild: {", ".join(map(str, plan["matchups"]["to_process"]))}')
+    return '\n'.join(lines)
@@ -2,6 +2,7 @@ from collections import Counter, defaultdict
 
 import numpy as np
 
+import utils.aggregates
 import utils.common
 
 
@@ -39,35 +40,28 @@ def calculate_pairwise_h2h(scores):
     return pairwise_h2h
 
 
-def calculate_scores_metrics(scores_pairs, matchups):
-    metrics = {
-        'opponent_scores': defaultdict(list),
-        'luck': defaultdict(list),
-        'opponent_luck': defaultdict(list),
-        'places': defaultdict(list),
-        'opponent_places': defaultdict(list),
-    }
-
-    opponent_scores = metrics['opponent_scores']
-    for m in matchups:
-        matchup_results = scores_pairs[m]
-        for p1, p2 in matchup_results:
-            opponent_scores[p1[0]].append(p2[1])
-            opponent_scores[p2[0]].append(p1[1])
-
-    for m in matchups:
-        matchup_results = scores_pairs[m]
-        matchup_scores = {team: score for pair in matchup_results for team, score in pair}
-        matchup_places = utils.common.get_places(matchup_scores, True)
-        opp_dict = utils.common.get_opponent_dict(matchup_results)
-
-        for team in matchup_places:
-            metrics['places'][team].append(matchup_places[team])
-            metrics['opponent_places'][team].append(matchup_places[opp_dict[team]])
-
-        matchup_luck = _calculate_luck_score(matchup_results, matchup_places)
-        for team in matchup_luck:
-            metrics['luck'][team].append(matchup_luck[team])
-            metrics['opponent_luck'][team].append(matchup_luck[opp_dict[team]])
-
-    return metrics
+def _fold_scores_metrics(metrics, m, scores_pairs):
+    matchup_results = scores_pairs[m]
+    opp_dict = utils.common.get_opponent_dict(matchup_results)
+    for p1, p2 in matchup_results:
+        metrics['opponent_scores'].setdefault(p1[0], []).append(p2[1])
+        metrics['opponent_scores'].setdefault(p2[0], []).append(p1[1])
+
+    matchup_scores = {team: score for pair in matchup_results for team, score in pair}
+    matchup_places = utils.common.get_places(matchup_scores, True)
+    for team in matchup_places:
+        metrics['places'].setdefault(team, []).append(matchup_places[team])
+        metrics['opponent_places'].setdefault(team, []).append(matchup_places[opp_dict[team]])
+
+    matchup_luck = _calculate_luck_score(matchup_results, matchup_places)
+    for team in matchup_luck:
+        metrics['luck'].setdefault(team, []).append(matchup_luck[team])
+        metrics['opponent_luck'].setdefault(team, []).append(matchup_luck[opp_dict[team]])
+
+
+def calculate_scores_metrics(scores_pairs, matchups, aggregates=None):
+    metrics_names = ['opponent_scores', 'luck', 'opponent_luck', 'places', 'opponent_places']
+    metrics = utils.aggregates.fold(
+        aggregates, max(matchups), lambda: {name: {} for name in metrics_names},
+        lambda metrics, m: _fold_scores_metrics(metrics, m, scores_pairs))
+    return {name: defaultdict(list, metrics[name]) for name in metrics_names}
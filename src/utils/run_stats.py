@@ -0,0 +1,37 @@
+from collections import defaultdict
+import threading
+
+
+_lock = threading.Lock()
+_stats = defaultdict(dict)
+
+
+def add(section, key, value=1):
+    with _lock:
+        _stats[section][key] = _stats[section].get(key, 0) + value
+
+
+def set_value(section, key, value):
+    with _lock:
+        _stats[section][key] = value
+
+
+def maximum(section, key, value):
+    with _lock:
+        _stats[section][key] = max(_stats[section].get(key, value), value)
+
+
+def get(section, key, default=0):
+    with _lock:
+        return _stats[section].get(key, default)
+
+
+def format_report():
+    lines = []
+    with _lock:
+        for section in sorted(_stats):
+            values = ', '.join(
+                f'{key}: {value:g}' if isinstance(value, (int, float)) else f'{key}: {value}'
+                for key, value in _stats[section].items())
+            lines.append(f'[{section}] {values}')
+    return '\n'.join(lines)
@@ -0,0 +1,75 @@
+from collections import defaultdict, OrderedDict
+import sys
+import threading
+
+import numpy as np
+
+import utils.run_stats
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_generations = defaultdict(int)
+_max_bytes = 256 * 2 ** 20
+_total_bytes = 0
+
+
+def approximate_size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximate_size(item) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += approximate_size(vars(value))
+    return size
+
+
+def _evict():
+    global _total_bytes
+    while _entries and _total_bytes > _max_bytes:
+        _, (_, size) = _entries.popitem(last=False)
+        _total_bytes -= size
+        utils.run_stats.add('season cache', 'evictions')
+
+
+def configure(max_mb):
+    global _max_bytes
+    with _lock:
+        _max_bytes = max_mb * 2 ** 20
+        _evict()
+
+
+def get(key, load):
+    global _total_bytes
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            utils.run_stats.add('season cache', 'hits')
+            return _entries[key][0]
+        generation = _generations[key]
+
+    utils.run_stats.add('season cache', 'misses')
+    value = load()
+    size = approximate_size(value)
+    with _lock:
+        if key in _entries:
+            _total_bytes -= _entries.pop(key)[1]
+        # Data saved while it was loading makes this value stale, so it is returned but not kept
+        if size <= _max_bytes and generation == _generations[key]:
+            _entries[key] = (value, size)
+            _total_bytes += size
+            _evict()
+        utils.run_stats.set_value('season cache', 'cached mb', round(_total_bytes / 2 ** 20, 1))
+    return value
+
+
+def invalidate(key):
+    global _total_bytes
+    with _lock:
+        _generations[key] += 1
+        if key in _entries:
+            _total_bytes -= _entries.pop(key)[1]
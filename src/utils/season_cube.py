@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+from utils.json_utils import dump as json_dump
+from utils.json_utils import load as json_load
+
+
+_cube_name = 'category_cube.npy'
+_teams_name = 'category_cube_teams.json'
+_categories_name = 'category_cube_categories.json'
+
+
+def stat_value(value):
+    if isinstance(value, str):
+        minutes, seconds = value.split(':')
+        return int(minutes) + int(seconds) / 60
+    return value
+
+
+class SeasonCube(object):
+    def __init__(self, values, team_ids, categories, lowered=None):
+        self.values = values
+        self.team_index = {team_id: index for index, team_id in enumerate(team_ids)}
+        self.category_index = {cat: index for index, cat in enumerate(categories)}
+        # (is_lowered[team, matchup], lowers[category]) replaces stats on read, so mapped values are never copied
+        self.lowered = lowered
+
+    def matchup_stats(self, m, teams, categories):
+        columns = [self.category_index[cat] for cat in categories]
+        matchup_values = self.values[:, m - 1, columns]
+        if self.lowered is not None:
+            is_lowered, lowers = self.lowered
+            column_lowers = lowers[columns]
+            is_replaced = is_lowered[:, m - 1, np.newaxis] & ~np.isnan(column_lowers)
+            matchup_values = np.where(is_replaced, column_lowers, matchup_values)
+        return {team: matchup_values[self.team_index[team[1]]].tolist() for team in teams}
+
+
+def build(season_scoreboards):
+    team_ids = []
+    categories = []
+    for m in sorted(season_scoreboards):
+        _, team_names, category_pairs, _ = season_scoreboards[m]
+        if category_pairs is None:
+            continue
+        team_ids.extend(team_id for team_id in team_names if team_id not in team_ids)
+        categories.extend(cat for cat in category_pairs[1] if cat not in categories)
+    if not categories:
+        return None
+
+    cube = SeasonCube(None, team_ids, categories)
+    values = np.full((len(team_ids), max(season_scoreboards), len(categories)), np.nan)
+    for m, (_, _, category_pairs, _) in season_scoreboards.items():
+        if category_pairs is None:
+            continue
+        stats_pairs, matchup_categories = category_pairs
+        columns = [cube.category_index[cat] for cat in matchup_categories]
+        for pair in stats_pairs:
+            for team, stats in pair:
+                values[cube.team_index[team[1]], m - 1, columns] = [stat_value(value) for _, value in stats]
+    cube.values = values
+    return cube
+
+
+def save(season_dir, cube):
+    cube_path = os.path.join(season_dir, _cube_name)
+    if cube is None:
+        if os.path.isfile(cube_path):
+            os.remove(cube_path)
+        return
+
+    # Readers may have the old cube mapped, so it is replaced rather than rewritten in place
+    tmp_cube_path = os.path.join(season_dir, f'tmp_{_cube_name}')
+    np.save(tmp_cube_path, cube.values)
+    json_dump(list(cube.team_index), os.path.join(season_dir, _teams_name))
+    json_dump(list(cube.category_index), os.path.join(season_dir, _categories_name))
+    os.replace(tmp_cube_path, cube_path)
+
+
+def load(season_dir):
+    cube_path = os.path.join(season_dir, _cube_name)
+    if not os.path.isfile(cube_path):
+        return None
+
+    team_ids = json_load(os.path.join(season_dir, _teams_name))
+    categories = json_load(os.path.join(season_dir, _categories_name))
+    return SeasonCube(np.load(cube_path, mmap_mode='r'), team_ids, categories)
@@ -0,0 +1,339 @@
+from collections import defaultdict
+import datetime
+import json
+import os
+import pathlib
+import sqlite3
+
+
+_store_name = 'season.sqlite3'
+_schema = '''
+CREATE TABLE IF NOT EXISTS scoreboards (
+    matchup INTEGER PRIMARY KEY,
+    league_name TEXT NOT NULL,
+    categories TEXT
+);
+CREATE TABLE IF NOT EXISTS scoreboard_teams (
+    matchup INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    team_name TEXT NOT NULL,
+    PRIMARY KEY (matchup, position)
+);
+CREATE TABLE IF NOT EXISTS matchup_scores (
+    matchup INTEGER NOT NULL,
+    pair INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    points REAL,
+    record TEXT,
+    PRIMARY KEY (matchup, pair, side)
+);
+CREATE TABLE IF NOT EXISTS category_stats (
+    matchup INTEGER NOT NULL,
+    pair INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    value REAL,
+    time_value TEXT,
+    PRIMARY KEY (matchup, pair, side, position)
+);
+CREATE TABLE IF NOT EXISTS box_score_teams (
+    matchup INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    n_tables INTEGER NOT NULL,
+    PRIMARY KEY (matchup, position)
+);
+CREATE TABLE IF NOT EXISTS box_score_columns (
+    matchup INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    table_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    long_name TEXT NOT NULL,
+    short_name TEXT NOT NULL,
+    PRIMARY KEY (matchup, team_id, table_index, position)
+);
+CREATE TABLE IF NOT EXISTS box_score_players (
+    matchup INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    table_index INTEGER NOT NULL,
+    player_position INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    PRIMARY KEY (matchup, team_id, table_index, player_position)
+);
+CREATE TABLE IF NOT EXISTS box_score_lines (
+    matchup INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    table_index INTEGER NOT NULL,
+    player_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    stat TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (matchup, team_id, table_index, player_position, position)
+);
+CREATE TABLE IF NOT EXISTS box_score_totals (
+    matchup INTEGER NOT NULL,
+    team_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    stat TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (matchup, team_id, position)
+);
+CREATE TABLE IF NOT EXISTS schedule (
+    matchup INTEGER PRIMARY KEY,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    is_playoffs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    kind TEXT NOT NULL,
+    matchup INTEGER NOT NULL,
+    input_hash TEXT NOT NULL,
+    result BLOB NOT NULL,
+    PRIMARY KEY (kind, matchup)
+);
+'''
+_scoreboard_tables = ['scoreboard_teams', 'matchup_scores', 'category_stats']
+_box_scores_tables = [
+    'box_score_teams', 'box_score_columns', 'box_score_players', 'box_score_lines', 'box_score_totals'
+]
+
+
+def is_saved(season_dir):
+    return os.path.isfile(os.path.join(season_dir, _store_name))
+
+
+class SeasonStore(object):
+    def __init__(self, league_id, season_dir, read_only=False):
+        self.__league_id = league_id
+        if read_only:
+            # Even a mode=ro connection leaves WAL side files behind, so read-only stores are opened as immutable
+            store_uri = pathlib.Path(season_dir, _store_name).absolute().as_uri()
+            self.__connection = sqlite3.connect(f'{store_uri}?mode=ro&immutable=1', uri=True)
+            return
+
+        os.makedirs(season_dir, exist_ok=True)
+        self.__connection = sqlite3.connect(os.path.join(season_dir, _store_name))
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__connection.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.__connection.close()
+
+    def __delete_matchups(self, tables, matchups):
+        for table in tables:
+            self.__connection.executemany(f'DELETE FROM {table} WHERE matchup = ?', [(m,) for m in matchups])
+
+    def scoreboards(self):
+        league_names = {}
+        categories = {}
+        for m, league_name, matchup_categories in self.__connection.execute('SELECT * FROM scoreboards'):
+            league_names[m] = league_name
+            categories[m] = None if matchup_categories is None else json.loads(matchup_categories)
+
+        team_names = defaultdict(dict)
+        teams_query = 'SELECT matchup, team_id, team_name FROM scoreboard_teams ORDER BY matchup, position'
+        for m, team_id, team_name in self.__connection.execute(teams_query):
+            team_names[m][team_id] = team_name
+        team_key = lambda m, team_id: (team_names[m][team_id], team_id, league_names[m], self.__league_id)
+
+        scores = defaultdict(list)
+        scores_query = 'SELECT matchup, pair, team_id, points, record FROM matchup_scores ORDER BY matchup, pair, side'
+        for m, pair, team_id, points, record in self.__connection.execute(scores_query):
+            if pair == len(scores[m]):
+                scores[m].append([])
+            scores[m][pair].append((team_key(m, team_id), points if record is None else record))
+
+        stats_pairs = defaultdict(list)
+        stats_query = ('SELECT matchup, pair, side, team_id, category, value, time_value FROM category_stats '
+                       'ORDER BY matchup, pair, side, position')
+        for m, pair, side, team_id, category, value, time_value in self.__connection.execute(stats_query):
+            if pair == len(stats_pairs[m]):
+                stats_pairs[m].append([])
+            if side == len(stats_pairs[m][pair]):
+                stats_pairs[m][pair].append((team_key(m, team_id), []))
+            stats_pairs[m][pair][side][1].append((category, value if time_value is None else time_value))
+
+        scoreboards = {}
+        for m, league_name in league_names.items():
+            category_pairs = None if categories[m] is None else (stats_pairs[m], categories[m])
+            scoreboards[m] = (scores[m], team_names[m], category_pairs, league_name)
+        return scoreboards
+
+    def save_scoreboards(self, scoreboards):
+        if not scoreboards:
+            return
+
+        with self.__connection:
+            self.__delete_matchups(_scoreboard_tables, scoreboards)
+            for m, (matchup_scores, team_names, category_pairs, league_name) in scoreboards.items():
+                categories = None if category_pairs is None else json.dumps(category_pairs[1])
+                self.__connection.execute(
+                    'INSERT INTO scoreboards VALUES (?, ?, ?) ON CONFLICT (matchup) DO UPDATE SET '
+                    'league_name = excluded.league_name, categories = excluded.categories',
+                    (m, league_name, categories))
+                self.__connection.executemany(
+                    'INSERT INTO scoreboard_teams VALUES (?, ?, ?, ?)',
+                    [
+                        (m, position, team_id, team_name)
+                        for position, (team_id, team_name) in enumerate(team_names.items())
+                    ])
+                self.__connection.executemany(
+                    'INSERT INTO matchup_scores VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (m, pair, side, team[1], score if isinstance(score, float) else None,
+                         None if isinstance(score, float) else score)
+                        for pair, pair_scores in enumerate(matchup_scores)
+                        for side, (team, score) in enumerate(pair_scores)
+                    ])
+                if category_pairs is None:
+                    continue
+                self.__connection.executemany(
+                    'INSERT INTO category_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [
+                        (m, pair, side, position, team[1], category, value if isinstance(value, float) else None,
+                         None if isinstance(value, float) else value)
+                        for pair, pair_stats in enumerate(category_pairs[0])
+                        for side, (team, stats) in enumerate(pair_stats)
+                        for position, (category, value) in enumerate(stats)
+                    ])
+
+    def manifest(self):
+        return {
+            'schedule': {m for m, in self.__connection.execute('SELECT matchup FROM schedule')},
+            'scoreboards': {m for m, in self.__connection.execute('SELECT matchup FROM scoreboards')},
+            'box_scores': {m for m, in self.__connection.execute('SELECT DISTINCT matchup FROM box_score_teams')},
+        }
+
+    def box_scores(self, matchup=None):
+        condition = '' if matchup is None else 'WHERE matchup = ? '
+        params = () if matchup is None else (matchup,)
+        box_scores = defaultdict(dict)
+        teams_query = f'SELECT matchup, team_id, n_tables FROM box_score_teams {condition}ORDER BY matchup, position'
+        for m, team_id, n_tables in self.__connection.execute(teams_query, params):
+            box_scores[m][team_id] = ([([], {}) for _ in range(n_tables)], [{} for _ in range(n_tables)], {})
+
+        columns_query = (f'SELECT matchup, team_id, table_index, long_name, short_name FROM box_score_columns '
+                         f'{condition}ORDER BY matchup, team_id, table_index, position')
+        for m, team_id, table_index, long_name, short_name in self.__connection.execute(columns_query, params):
+            columns_ordered, columns_to_short = box_scores[m][team_id][0][table_index]
+            columns_ordered.append(long_name)
+            columns_to_short[long_name] = short_name
+
+        players_query = (f'SELECT matchup, team_id, table_index, player FROM box_score_players '
+                         f'{condition}ORDER BY matchup, team_id, table_index, player_position')
+        for m, team_id, table_index, player in self.__connection.execute(players_query, params):
+            box_scores[m][team_id][1][table_index][player] = {}
+
+        lines_query = (f'SELECT matchup, team_id, table_index, player, stat, value FROM box_score_lines '
+                       f'JOIN box_score_players USING (matchup, team_id, table_index, player_position) '
+                       f'{condition}ORDER BY matchup, team_id, table_index, player_position, position')
+        for m, team_id, table_index, player, stat, value in self.__connection.execute(lines_query, params):
+            box_scores[m][team_id][1][table_index][player][stat] = value
+
+        totals_query = (f'SELECT matchup, team_id, stat, value FROM box_score_totals '
+                        f'{condition}ORDER BY matchup, team_id, position')
+        for m, team_id, stat, value in self.__connection.execute(totals_query, params):
+            box_scores[m][team_id][2][stat] = value
+        return box_scores
+
+    def box_score_totals(self):
+        box_score_totals = defaultdict(dict)
+        totals_query = ('SELECT matchup, team_id, stat, value FROM box_score_teams '
+                        'LEFT JOIN box_score_totals USING (matchup, team_id) '
+                        'ORDER BY matchup, box_score_teams.position, box_score_totals.position')
+        for m, team_id, stat, value in self.__connection.execute(totals_query):
+            team_totals = box_score_totals[m].setdefault(team_id, {})
+            if stat is not None:
+                team_totals[stat] = value
+        return box_score_totals
+
+    def save_box_scores(self, box_scores):
+        if not box_scores:
+            return
+
+        with self.__connection:
+            self.__delete_matchups(_box_scores_tables, box_scores)
+            for m, matchup_box_scores in box_scores.items():
+                teams = [(team[1], stats) for team, stats in matchup_box_scores.items()]
+                self.__connection.executemany(
+                    'INSERT INTO box_score_teams VALUES (?, ?, ?, ?)',
+                    [(m, position, team_id, len(titles)) for position, (team_id, (titles, _, _)) in enumerate(teams)])
+                self.__connection.executemany(
+                    'INSERT INTO box_score_columns VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (m, team_id, table_index, position, long_name, columns_to_short[long_name])
+                        for team_id, (titles, _, _) in teams
+                        for table_index, (columns_ordered, columns_to_short) in enumerate(titles)
+                        for position, long_name in enumerate(columns_ordered)
+                    ])
+                self.__connection.executemany(
+                    'INSERT INTO box_score_players VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (m, team_id, table_index, player_position, player)
+                        for team_id, (_, data, _) in teams
+                        for table_index, table_data in enumerate(data)
+                        for player_position, player in enumerate(table_data)
+                    ])
+                self.__connection.executemany(
+                    'INSERT INTO box_score_lines VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [
+                        (m, team_id, table_index, player_position, position, stat, value)
+                        for team_id, (_, data, _) in teams
+                        for table_index, table_data in enumerate(data)
+                        for player_position, player_stats in enumerate(table_data.values())
+                        for position, (stat, value) in enumerate(player_stats.items())
+                    ])
+                self.__connection.executemany(
+                    'INSERT INTO box_score_totals VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (m, team_id, position, stat, value)
+                        for team_id, (_, _, totals) in teams
+                        for position, (stat, value) in enumerate(totals.items())
+                    ])
+
+    def schedule(self):
+        schedule = {}
+        for m, start_date, end_date, is_playoffs in self.__connection.execute('SELECT * FROM schedule'):
+            dates = (datetime.date.fromisoformat(start_date), datetime.date.fromisoformat(end_date))
+            schedule[m] = (dates, bool(is_playoffs))
+        return schedule
+
+    def save_schedule(self, schedule):
+        with self.__connection:
+            self.__connection.execute('DELETE FROM schedule')
+            self.__connection.executemany(
+                'INSERT INTO schedule VALUES (?, ?, ?, ?)',
+                [
+                    (m, dates[0].isoformat(), dates[1].isoformat(), int(is_playoffs))
+                    for m, (dates, is_playoffs) in schedule.items()
+                ])
+
+    def aggregate_hashes(self, kind):
+        aggregate_hashes = {}
+        hashes_query = 'SELECT matchup, input_hash FROM aggregates WHERE kind = ?'
+        for m, input_hash in self.__connection.execute(hashes_query, (kind,)):
+            aggregate_hashes[m] = input_hash
+        return aggregate_hashes
+
+    def aggregate(self, kind, matchup):
+        aggregate_query = 'SELECT result FROM aggregates WHERE kind = ? AND matchup = ?'
+        row = self.__connection.execute(aggregate_query, (kind, int(matchup))).fetchone()
+        return None if row is None else row[0]
+
+    def save_aggregates(self, kind, aggregates):
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT INTO aggregates VALUES (?, ?, ?, ?) ON CONFLICT (kind, matchup) DO UPDATE SET '
+                'input_hash = excluded.input_hash, result = excluded.result',
+                [(kind, int(m), input_hash, result) for m, (input_hash, result) in aggregates.items()])
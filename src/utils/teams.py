@@ -0,0 +1,55 @@
+import threading
+
+import numpy as np
+
+import utils.run_stats
+
+
+_lock = threading.Lock()
+_indexes = {}
+_keys = []
+
+
+def register(league_id, league_name, team_names):
+    league_indexes = {}
+    with _lock:
+        for team_id, team_name in team_names.items():
+            key = (team_name, team_id, league_name, league_id)
+            index = _indexes.setdefault((league_id, team_id), len(_keys))
+            if index == len(_keys):
+                _keys.append(key)
+            elif _keys[index] != key:
+                # Keys handed out before keep the old name, but they still resolve to the same team index
+                _keys[index] = key
+                utils.run_stats.add('teams', 'renamed')
+            league_indexes[team_id] = index
+    return league_indexes
+
+
+def register_keys(league_id, league_name, team_names):
+    return {team_id: _keys[index] for team_id, index in register(league_id, league_name, team_names).items()}
+
+
+def index(league_id, team_id):
+    return _indexes[(league_id, team_id)]
+
+
+def key(team_index):
+    return _keys[team_index]
+
+
+def key_indexes(team_keys):
+    return np.array([_indexes[(team_key[3], team_key[1])] for team_key in team_keys], dtype=int)
+
+
+def season_indexes(teams_groups):
+    team_indexes = np.concatenate([key_indexes(teams) for teams in teams_groups] + [np.zeros(0, dtype=int)])
+    _, first_positions = np.unique(team_indexes, return_index=True)
+    return team_indexes[np.sort(first_positions)]
+
+
+def rows(team_indexes):
+    # Season arrays hold only the teams given, so their rows are looked up by team index
+    team_rows = np.full(np.max(team_indexes, initial=-1) + 1, -1, dtype=int)
+    team_rows[team_indexes] = np.arange(len(team_indexes))
+    return team_rows
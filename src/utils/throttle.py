@@ -0,0 +1,132 @@
+from collections import defaultdict
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import utils.run_stats
+
+
+class RateLimiter(object):
+    def __init__(self, host, settings):
+        self.__host = host
+        self.__rate = settings['rate']
+        self.__min_rate = settings['min_rate']
+        self.__max_rate = settings['max_rate']
+        self.__capacity = settings['burst']
+        self.__increase = settings['increase']
+        self.__decrease = settings['decrease']
+        self.__tokens = self.__capacity
+        self.__last_refill = time.monotonic()
+        self.__start_time = self.__last_refill
+        self.__lock = threading.Lock()
+
+    def __refill(self, now):
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__last_refill) * self.__rate)
+        self.__last_refill = now
+
+    def acquire(self):
+        with self.__lock:
+            self.__refill(time.monotonic())
+            self.__tokens -= 1
+            wait_time = max(0.0, -self.__tokens / self.__rate)
+
+        time.sleep(wait_time)
+        self.__record_page(wait_time)
+        return wait_time
+
+    def on_success(self):
+        with self.__lock:
+            self.__refill(time.monotonic())
+            self.__rate = min(self.__max_rate, self.__rate + self.__increase)
+        utils.run_stats.set_value(f'rate limit {self.__host}', 'rate', round(self.__rate, 3))
+
+    def on_failure(self):
+        with self.__lock:
+            self.__refill(time.monotonic())
+            self.__rate = max(self.__min_rate, self.__rate * self.__decrease)
+            self.__tokens = min(self.__tokens, 0.0)
+        utils.run_stats.add(f'rate limit {self.__host}', 'failures')
+        utils.run_stats.set_value(f'rate limit {self.__host}', 'rate', round(self.__rate, 3))
+
+    def __record_page(self, wait_time):
+        section = f'rate limit {self.__host}'
+        utils.run_stats.add(section, 'pages')
+        utils.run_stats.add(section, 'wait seconds', wait_time)
+        pages = utils.run_stats.get(section, 'pages')
+        total_wait = utils.run_stats.get(section, 'wait seconds')
+        elapsed_minutes = max(time.monotonic() - self.__start_time, 1.0) / 60
+        utils.run_stats.set_value(section, 'pages per minute', round(pages / elapsed_minutes, 2))
+        utils.run_stats.set_value(section, 'mean page wait', round(total_wait / pages, 2))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def host_limiter(url, settings):
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(host, settings)
+        return _limiters[host]
+
+
+class RetryPolicy(object):
+    def __init__(self, settings):
+        self.max_attempts = settings['max_attempts']
+        self.__base_delay = settings['base_delay']
+        self.__max_delay = settings['max_delay']
+
+    def delay(self, attempt):
+        return min(self.__max_delay, self.__base_delay * 2 ** attempt)
+
+
+class CircuitBreaker(object):
+    def __init__(self, settings):
+        self.__failure_threshold = settings['failure_threshold']
+        self.__reset_timeout = settings['reset_timeout']
+        self.__failures = defaultdict(int)
+        self.__opened_at = {}
+        self.__lock = threading.Lock()
+
+    def allow(self, key):
+        with self.__lock:
+            opened_at = self.__opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.__reset_timeout:
+                return False
+            del self.__opened_at[key]
+            self.__failures[key] = self.__failure_threshold - 1
+            return True
+
+    def is_open(self, key):
+        with self.__lock:
+            opened_at = self.__opened_at.get(key)
+            return opened_at is not None and time.monotonic() - opened_at < self.__reset_timeout
+
+    def on_success(self, key):
+        with self.__lock:
+            self.__failures[key] = 0
+
+    def on_failure(self, key):
+        with self.__lock:
+            self.__failures[key] += 1
+            is_tripped = self.__failures[key] >= self.__failure_threshold and key not in self.__opened_at
+            if is_tripped:
+                self.__opened_at[key] = time.monotonic()
+        utils.run_stats.add('retries', 'failed attempts')
+        if is_tripped:
+            utils.run_stats.add('retries', 'circuit breaker trips')
+            print(f'[Circuit breaker] Too many failed pages for {key}, pausing its requests', file=sys.stderr)
+
+
+_breakers = {}
+
+
+def circuit_breaker(name, settings):
+    with _limiters_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(settings)
+        return _breakers[name]